@@ -1,18 +1,24 @@
-import os, uuid, math
-from typing import List, Dict, Any
+import os, uuid, time, asyncio, contextvars, logging, threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import List, Dict, Any, Callable, Tuple
 from langgraph.graph import StateGraph, START, END
 from pydantic import BaseModel
-from .rag.retriever import retriever
+from .rag.retriever import get_retriever, query_text, city_key
+from .rag import poi_index
 from .tools import weather as weather_tool
 from .tools import fx as fx_tool
 from .tools import trips as trips_tool
 from .tools import calendar as ics_tool
 from .memory import long_term as memory
+from .models.itinerary import Itinerary, Poi
+from . import llm, metrics, scheduler
 
 from langchain.schema import HumanMessage, SystemMessage
 from dotenv import load_dotenv
 load_dotenv()  # now os.getenv("GROQ_API_KEY") works
 
+log = logging.getLogger(__name__)
+
 class TripState(BaseModel):
     user: str
     city: str
@@ -23,7 +29,7 @@ class TripState(BaseModel):
     interests: List[str] = []
     pace: str = "relaxed"
     working_notes: List[str] = []
-    candidate_plan: str | None = None
+    itinerary: Itinerary | None = None
     budget_breakdown: Dict[str, Any] = {}
     critiques: List[str] = []
     finalized_plan: str | None = None
@@ -36,27 +42,55 @@ def _days(start: str, end: str) -> int:
     s = date.fromisoformat(start); e = date.fromisoformat(end)
     return max((e - s).days + 1, 1)
 
-def _rule_based_plan(city: str, days: int, pois: List[str], weather_lines: List[str]) -> str:
-    # Generate a daily travel itinerary that includes:
-    # A set number of POIs (Points of Interest) per day
-    # The weather forecast for each day
-    
-    per_day = max(3, min(6, math.ceil(len(pois)/max(days,1)))) if pois else 4 # How many POIs to schedule per day
-    lines = [f"# Itinerary for {city}", ""]
-    idx = 0
-    for d in range(days):
-        lines.append(f"Day {d+1}:")
-        for _ in range(per_day):
-            if idx < len(pois):
-                lines.append(f"- {pois[idx]}")
-                idx += 1
-        if weather_lines:
-            lines.append(f"- Weather: {weather_lines[min(d, len(weather_lines)-1)]}")
-        lines.append("")
-    return "\n".join(lines)
+# Research fan-out: the external lookups don't depend on each other, so they run
+# on a shared bounded pool and the node costs roughly the slowest call.
+RESEARCH_WORKERS = int(os.getenv("RESEARCH_WORKERS", "16"))
+RESEARCH_TIMEOUTS = {  # seconds, per sub-call
+    "rag": float(os.getenv("RESEARCH_TIMEOUT_RAG", "15")),
+    "weather": float(os.getenv("RESEARCH_TIMEOUT_WEATHER", "10")),
+    "poi": float(os.getenv("RESEARCH_TIMEOUT_POI", "10")),
+    "fx": float(os.getenv("RESEARCH_TIMEOUT_FX", "5")),
+}
+_research_pool = ThreadPoolExecutor(max_workers=RESEARCH_WORKERS, thread_name_prefix="research")
 
-# Nodes
-def research_destinations(state: TripState) -> TripState:
+def _timed(name: str, fn: Callable[[], Any],
+           claim: Callable[[], bool] = lambda: True) -> Callable[[], Tuple[Any, str | None, float]]:
+    # `claim()` is False once the caller has timed the call out and recorded that itself
+    def run():
+        t0 = time.perf_counter()
+        try:
+            out, err = fn(), None
+        except Exception as e:
+            out, err = None, f"{type(e).__name__}: {e}"
+        took = time.perf_counter() - t0
+        if claim():
+            metrics.record_tool(name, t0, took, err)
+        return out, err, took
+    return run
+
+def _fan_out(calls: Dict[str, Callable[[], Any]]) -> Dict[str, Tuple[Any, str | None, float]]:
+    # name -> (result or None, error or None, seconds). A failing or slow call
+    # degrades to None instead of holding up the others.
+    t0 = time.perf_counter()
+    # whichever of the call and its timeout gets the lock first records the metric
+    claims = {name: threading.Lock() for name in calls}
+    # each call runs in a copy of this context so it lands in the request's trace
+    futures = {name: _research_pool.submit(contextvars.copy_context().run,
+                                           _timed(name, fn, lambda n=name: claims[n].acquire(blocking=False)))
+               for name, fn in calls.items()}
+    results = {}
+    for name, fut in futures.items():
+        budget = RESEARCH_TIMEOUTS.get(name, 10.0)
+        try:
+            results[name] = fut.result(timeout=max(0.0, t0 + budget - time.perf_counter()))
+        except FutureTimeout:
+            fut.cancel()
+            results[name] = (None, f"timeout after {budget:.1f}s", time.perf_counter() - t0)
+            if claims[name].acquire(blocking=False):
+                metrics.record_tool(name, t0, results[name][2], results[name][1])
+    return results
+
+def _load_prefs(state: TripState):
     prefs = memory.get_prefs(state.user)
     if prefs:
         state.working_notes.append(f"Loaded user prefs: {prefs}")
@@ -65,58 +99,194 @@ def research_destinations(state: TripState) -> TripState:
         interests |= set(prefs.get("interests", []))
         state.interests = list(interests)
 
-    chunks = retriever.search(state.city, state.interests, k=10)
-    top = [c["content"].splitlines()[0].replace("#","").strip() for c in chunks[:12]]
+def _indexed_pois(city: str) -> List[Dict[str, Any]]:
+    return poi_index.lookup(city, limit=200)  # the scheduler picks compact days from a wider pool
+
+def _live_fallback(city: str):
+    # degraded path: a network call per plan, and bare names the scheduler can't route
+    log.warning("POI table has no rows for %s; falling back to live geosearch", city)
+
+def _pois(city: str) -> List[Any]:
+    rows = _indexed_pois(city)
+    if rows:
+        return rows
+    _live_fallback(city)
+    return trips_tool.list_poi(city, limit=10)
+
+async def _apois(city: str) -> List[Any]:
+    rows = await asyncio.to_thread(_indexed_pois, city)
+    if rows:
+        return rows
+    _live_fallback(city)
+    return await trips_tool.alist_poi(city, limit=10)
+
+def _research_calls(state: TripState) -> Dict[str, Callable[[], Any]]:
+    return {
+        "rag": lambda: get_retriever().search(state.city, state.interests, k=10),
+        "weather": lambda: weather_tool.get_weather(state.city, state.start_date, state.end_date),
+        # precomputed table; live geosearch only for cities ingest didn't cover
+        "poi": lambda: _pois(state.city),
+        # budget in the destination's currency (same geocode lookup as the weather call)
+        "fx": lambda: fx_tool.to_local(state.budget, state.currency, state.city),
+    }
+
+def _merge_research(state: TripState, results: Dict[str, Tuple[Any, str | None, float]]) -> TripState:
+    for name, (_, err, took) in results.items():
+        state.working_notes.append(f"Timing {name}: {took * 1000:.0f} ms" + (f" (failed: {err})" if err else ""))
+
+    chunks = results["rag"][0] or []
+    metrics.observe_results("rag", len(chunks))
 
     # Weather
-    w = weather_tool.get_weather(state.city, state.start_date, state.end_date)
-    wbrief = weather_tool.weather_brief(w).splitlines()[1:]  # skip "Forecast:"
+    w = results["weather"][0]
+    wbrief = weather_tool.weather_brief(w).splitlines()[1:] if w else []  # skip "Forecast:"
     state.working_notes.append("RAG results gathered")
-    state.working_notes += [f"POI candidates: {', '.join(top[:10])}"]
 
-    # Optional: external POIs
-    pois = []
-    try:
-        pois = trips_tool.list_poi(state.city, limit=10) or []
-    except Exception as e:
-        print("Error:", type(e).__name__, "-", e)
-        pois = []
+    # POIs come from the ingest-time table (rows carry coordinates); live lookups are bare names
+    raw = results["poi"][0] or []
+    pois = [Poi(**p) if isinstance(p, dict) else Poi(p, source="geosearch") for p in raw if p]
+    if raw and not isinstance(raw[0], dict):
+        state.working_notes.append(f"POI table has no rows for {state.city}; used live geosearch")
+    metrics.observe_results("poi", len(pois))
 
-    # Combine POIs
-    poi_list = [p for p in top if p]  # from RAG headings
-    for p in pois:
-        if p and p not in poi_list:
-            poi_list.append(p)
+    # rows the retrieved guide text mentions (it matched the interests) go first, in rank order
+    text = " ".join(" ".join(c["content"].split()) for c in chunks).casefold()
+    mentioned = [p for p in pois if " ".join(p.name.split()).casefold() in text]
+    first = {id(p) for p in mentioned}
+    poi_list = mentioned + [p for p in pois if id(p) not in first]
+    state.working_notes.append(f"POI candidates: {', '.join(p.name for p in poi_list[:10])}"
+                               + (f" ({len(mentioned)} named in the guides)" if mentioned else ""))
 
-    # FX estimate (if user currency not local; we'll skip local detection)
-    est_local_budget, rate = fx_tool.convert(state.budget, state.currency, state.currency)
-    state.budget_breakdown = {"budget_input": state.budget, "currency": state.currency, "fx_rate": rate}
+    # rate, as_of and age are those of the snapshot the conversion used
+    fx = results["fx"][0] or {"local_currency": None, "budget_local": None, "fx_rate": None,
+                              "fx_rates_as_of": None, "fx_rates_age_s": None}
+    rate = fx["fx_rate"]
+    state.budget_breakdown = {"budget_input": state.budget, "currency": state.currency, **fx}
 
     # store interim
     state.working_notes.append(f"Weather lines: {wbrief[:3]}")
     state.working_notes.append(f"Total POIs considered: {len(poi_list)}")
-    state.working_notes.append(f"FX rate: {rate}")
+    state.working_notes.append(f"FX rate: {rate}" + (f" ({state.currency} -> {fx['local_currency']}, "
+                                                      f"rates as of {fx['fx_rates_as_of']})" if rate else ""))
     state.working_notes.append(f"Budget (input): {state.budget} {state.currency}")
 
     # stash for planner
-    state.candidate_plan = _rule_based_plan(state.city, _days(state.start_date, state.end_date), poi_list, wbrief)
+    days = _days(state.start_date, state.end_date)
+    t0 = time.perf_counter()
+    plan = scheduler.schedule(poi_list, days, scheduler.per_day(len(poi_list), days, state.pace),
+                              rainy=weather_tool.rainy_days(w) if w else ())
+    state.working_notes.append(f"Scheduled {sum(map(len, plan))} stops in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    state.itinerary = Itinerary.from_days(state.city, poi_list, plan, wbrief)
     return state
 
-def draft_itinerary(state: TripState) -> TripState:
-    messages = [
+async def _atimed(name: str, coro) -> Tuple[Any, str | None, float]:
+    budget = RESEARCH_TIMEOUTS.get(name, 10.0)
+    t0 = time.perf_counter()
+    try:
+        out, err = await asyncio.wait_for(coro, timeout=budget), None
+    except asyncio.TimeoutError:
+        out, err = None, f"timeout after {budget:.1f}s"
+    except Exception as e:
+        out, err = None, f"{type(e).__name__}: {e}"
+    took = time.perf_counter() - t0
+    metrics.record_tool(name, t0, took, err)
+    return out, err, took
+
+def _aresearch_calls(state: TripState) -> Dict[str, Any]:
+    # same calls as _research_calls; the embedder is CPU-bound, so RAG stays on a thread
+    return {
+        "rag": asyncio.to_thread(lambda: get_retriever().search(state.city, state.interests, k=10)),
+        "weather": weather_tool.aget_weather(state.city, state.start_date, state.end_date),
+        "poi": _apois(state.city),
+        "fx": fx_tool.ato_local(state.budget, state.currency, state.city),
+    }
+
+async def aprewarm(states: List[TripState]):
+    """Shared research for a batch: one geocode + forecast fetch per distinct city and
+    one encoder pass over the distinct RAG queries, so each trip's own calls hit caches."""
+    spans: Dict[str, Tuple[str, str, str]] = {}  # city key -> (city, first day, last day)
+    queries = set()
+    for st in states:
+        st = st.model_copy(deep=True)
+        _load_prefs(st)  # prefs change the RAG query
+        queries.add(query_text(st.city, st.interests))
+        city, start, end = spans.get(city_key(st.city), (st.city, st.start_date, st.end_date))
+        spans[city_key(st.city)] = (city, min(start, st.start_date), max(end, st.end_date))
+    await asyncio.gather(
+        asyncio.to_thread(lambda: get_retriever().encoder.encode_many(sorted(queries))),
+        *(weather_tool.aget_weather(city, start, end) for city, start, end in spans.values()),
+        return_exceptions=True,  # a failed warm-up just leaves that call to the trip itself
+    )
+
+# Nodes
+def research_destinations(state: TripState) -> TripState:
+    # prefs are a local read and feed the RAG query, so they go first
+    _load_prefs(state)
+    t0 = time.perf_counter()
+    results = _fan_out(_research_calls(state))
+    state.working_notes.append(f"Research fan-out: {(time.perf_counter() - t0) * 1000:.0f} ms")
+    return _merge_research(state, results)
+
+async def aresearch_destinations(state: TripState) -> TripState:
+    # async twin of research_destinations, used by app_graph.ainvoke
+    _load_prefs(state)
+    t0 = time.perf_counter()
+    calls = _aresearch_calls(state)
+    done = await asyncio.gather(*(_atimed(name, c) for name, c in calls.items()))
+    results = dict(zip(calls, done))
+    state.working_notes.append(f"Research fan-out: {(time.perf_counter() - t0) * 1000:.0f} ms")
+    return _merge_research(state, results)
+
+def _draft_messages(state: TripState):
+    return [
         SystemMessage(content="You are a travel planner. Produce concise, feasible day-by-day itineraries."),
         HumanMessage(content=f"City: {state.city}\nDates: {state.start_date} to {state.end_date}\n"
-                                f"Pace: {state.pace}\nInterests: {', '.join(state.interests)}\n"
-                                f"Draft based on notes:\n{state.candidate_plan}")
+                                f"Pace: {state.pace}\nInterests: {', '.join(sorted(state.interests))}\n"
+                                f"Draft based on notes:\n{state.itinerary.render()}")
     ]
+
+def _apply_draft(state: TripState, text: str) -> TripState:
+    # the one place LLM markdown is parsed; later nodes work on the structure
+    parsed = state.itinerary.from_markdown(text)
+    if parsed is None:
+        state.working_notes.append("LLM draft had no 'Day N' headings; using rule-based plan.")
+    else:
+        del parsed.days[_days(state.start_date, state.end_date):]  # the model sometimes runs past the trip
+        state.itinerary = parsed
+    return state
+
+def draft_itinerary(state: TripState) -> TripState:
+    messages = _draft_messages(state)
+    key = llm.response_cache.key(messages)
+    cached = llm.response_cache.get(key)
+    if cached is not None:
+        state.working_notes.append("LLM draft served from cache")
+        return _apply_draft(state, cached)
     try:
-        from langchain_groq import ChatGroq
-        llm = ChatGroq(model="llama-3.1-8b-instant")  # uses GROQ_API_KEY
-        res = llm.invoke(messages)                      # returns AIMessage
-        state.candidate_plan = res.content
+        with metrics.tool("llm"):
+            res = llm.get_llm().invoke(messages)        # returns AIMessage
+        llm.response_cache.put(key, res.content)
     except Exception as e:
         state.working_notes.append(f"llama failed: {e}; using rule-based plan.")
-    return state
+        return state
+    return _apply_draft(state, res.content)
+
+async def adraft_itinerary(state: TripState) -> TripState:
+    # async twin; under astream_events the model streams tokens to /plan/stream
+    messages = _draft_messages(state)
+    key = llm.response_cache.key(messages)
+    cached = llm.response_cache.get(key)
+    if cached is not None:
+        state.working_notes.append("LLM draft served from cache")
+        return _apply_draft(state, cached)
+    try:
+        with metrics.tool("llm"):
+            res = await llm.get_llm().ainvoke(messages)
+        llm.response_cache.put(key, res.content)
+    except Exception as e:
+        state.working_notes.append(f"llama failed: {e}; using rule-based plan.")
+        return state
+    return _apply_draft(state, res.content)
 
 def budget_check(state: TripState) -> TripState:
     days = _days(state.start_date, state.end_date)
@@ -126,57 +296,48 @@ def budget_check(state: TripState) -> TripState:
     state.budget_breakdown.update({"days": days, "estimated_total": total, "estimated_per_day": per_day})
     return state
 
+MAX_ITEMS_PER_DAY = 8
+
 def critic_review(state: TripState) -> TripState:
     issues = []
-    # simple heuristic: too many lines under any "Day" (>8 items)
-    for block in state.candidate_plan.split("\n\n"):
-        if block.lower().startswith("day "):
-            items = [l for l in block.splitlines() if l.strip().startswith("- ")]
-            if len(items) > 8:
-                issues.append("Some days are overpacked (>8 items).")
+    # simple heuristic: too many items on any day
+    if any(len(day.slots) > MAX_ITEMS_PER_DAY for day in state.itinerary.days):
+        issues.append(f"Some days are overpacked (>{MAX_ITEMS_PER_DAY} items).")
     state.critiques = issues
     return state
 
 def revise_plan(state: TripState) -> TripState:
     if not state.critiques:
         return state
-    # very naive: drop last item from each day’s block
-    lines = []
-    for block in state.candidate_plan.split("\n\n"):
-        if block.lower().startswith("day "):
-            items = [l for l in block.splitlines() if l.strip().startswith("- ")]
-            if len(items) > 8:
-                items = items[:-1]
-                lines.append("\n".join([block.splitlines()[0]] + items))
-            else:
-                lines.append(block)
-        else:
-            lines.append(block)
-    state.candidate_plan = "\n\n".join(lines)
+    # very naive: trim overpacked days
+    for day in state.itinerary.days:
+        del day.slots[MAX_ITEMS_PER_DAY:]
     return state
 
 def finalize(state: TripState) -> TripState:
-    state.finalized_plan = state.candidate_plan
-    state.trip_id = str(uuid.uuid4())[:8]
-    days = _days(state.start_date, state.end_date)
-    state.ics_path = ics_tool.make_ics(state.finalized_plan, state.city, state.start_date, days)
+    state.finalized_plan = state.itinerary.render()
+    state.trip_id = uuid.uuid4().hex  # the only key to the trip's calendar, so all 122 random bits
+    with metrics.tool("ics"):
+        state.ics_path = ics_tool.make_ics(state.itinerary, state.city, state.start_date, state.trip_id)
     # write memory
-    memory.upsert_prefs(state.user, {"interests": state.interests, "pace": state.pace})
+    with metrics.tool("prefs"):
+        memory.upsert_prefs(state.user, {"interests": state.interests, "pace": state.pace})
     return state
 
 # Build graph
 graph = StateGraph(TripState)
-graph.add_node("research", research_destinations)
-graph.add_node("plan", draft_itinerary)
-graph.add_node("budget", budget_check)
-graph.add_node("critic", critic_review)
-graph.add_node("revise", revise_plan)
-graph.add_node("finalize", finalize)
+graph.add_node("research", metrics.node("research", research_destinations, aresearch_destinations))
+graph.add_node("plan", metrics.node("plan", draft_itinerary, adraft_itinerary))
+# not "budget": a node may not share its name with a TripState field
+graph.add_node("budget_check", metrics.node("budget_check", budget_check))
+graph.add_node("critic", metrics.node("critic", critic_review))
+graph.add_node("revise", metrics.node("revise", revise_plan))
+graph.add_node("finalize", metrics.node("finalize", finalize))
 
 graph.add_edge(START, "research")
 graph.add_edge("research", "plan")
-graph.add_edge("plan", "budget")
-graph.add_edge("budget", "critic")
+graph.add_edge("plan", "budget_check")
+graph.add_edge("budget_check", "critic")
 
 def _route(state: TripState):
     return "revise" if state.critiques else "finalize"
@@ -0,0 +1,102 @@
+# apps/api/llm.py
+"""Chat model used by draft_itinerary.
+
+One client per process (so its HTTP connection pool is reused), an exact-match
+response cache keyed on a hash of the prompt, and an offline fake model for
+tests and benchmarks (LLM_PROVIDER=fake).
+"""
+import hashlib, json, os, re, threading, time
+from collections import OrderedDict
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "groq")  # "groq" | "fake"
+LLM_MODEL = os.getenv("LLM_MODEL", "llama-3.1-8b-instant")
+CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", str(6 * 3600)))
+
+class EchoChatModel(BaseChatModel):
+    """Offline stand-in: answers with the draft from the prompt, streamed word by word."""
+
+    token_delay_s: float = 0.0
+    latency_s: float = 0.0  # before the answer / first token, like a real model's round trip
+
+    @property
+    def _llm_type(self) -> str:
+        return "echo"
+
+    def _answer(self, messages: List[BaseMessage]) -> str:
+        text = str(messages[-1].content) if messages else ""
+        return text.split("Draft based on notes:\n", 1)[-1]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        for tok in re.findall(r"\S+\s*|\s+", self._answer(messages)):
+            if self.token_delay_s:
+                time.sleep(self.token_delay_s)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=tok))
+            if run_manager:
+                run_manager.on_llm_new_token(tok, chunk=chunk)
+            yield chunk
+
+_lock = threading.Lock()
+_llm: Optional[BaseChatModel] = None
+
+def get_llm() -> BaseChatModel:
+    global _llm
+    if _llm is None:
+        with _lock:
+            if _llm is None:
+                if LLM_PROVIDER == "fake":
+                    _llm = EchoChatModel(token_delay_s=float(os.getenv("FAKE_LLM_TOKEN_DELAY_S", "0")),
+                                         latency_s=float(os.getenv("FAKE_LLM_LATENCY_S", "0")))
+                else:
+                    from langchain_groq import ChatGroq
+                    _llm = ChatGroq(model=LLM_MODEL)  # uses GROQ_API_KEY
+    return _llm
+
+def model_id() -> str:
+    return f"{LLM_PROVIDER}:{LLM_MODEL}"
+
+class ResponseCache:
+    def __init__(self, size: int = CACHE_SIZE, ttl_s: float = CACHE_TTL_S):
+        self.size, self.ttl_s = size, ttl_s
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (text, expires_at)
+        self.hits = self.misses = 0
+
+    @staticmethod
+    def key(messages: List[BaseMessage]) -> str:
+        payload = [model_id()] + [[m.type, m.content] for m in messages]
+        return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            hit = self._data.get(key)
+            if hit and hit[1] > time.time():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return hit[0]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, text: str):
+        with self._lock:
+            self._data[key] = (text, time.time() + self.ttl_s)
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+response_cache = ResponseCache()
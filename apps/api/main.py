@@ -1,33 +1,112 @@
-from fastapi import FastAPI, HTTPException
+import asyncio, json, time
+from contextlib import asynccontextmanager
+from typing import List
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from .models.schemas import TripRequest, TripPlan
-from .graph import app_graph, TripState
-from .rag.ingest import PERSIST_DIR
+from .graph import app_graph, aprewarm, TripState
+from .rag import retriever as retriever_mod
+from .rag.retriever import PERSIST_DIR
+from .rag.jobs import jobs as ingest_jobs
+from .tools import http_client
+from .tools import fx as fx_tool
+from .tools import calendar as ics_tool
+from . import metrics
+from .plan_cache import plan_cache, akey as plan_key
 import os
 
-app = FastAPI(title="Travel Concierge API", version="0.1.0")
+# Seconds startup waits for the embedder; past that the app starts anyway and
+# /health reports not-ready until loading finishes in the background.
+WARMUP_BUDGET_S = float(os.getenv("RETRIEVER_WARMUP_BUDGET_S", "30"))
+
+# /plan/batch: trips planned at once, and the largest accepted batch
+BATCH_CONCURRENCY = int(os.getenv("PLAN_BATCH_CONCURRENCY", "8"))
+BATCH_MAX = int(os.getenv("PLAN_BATCH_MAX", "1000"))
+
+# With `gunicorn --preload`, load once in the master so forked workers share the pages.
+if os.getenv("PRELOAD_RETRIEVER") == "1":
+    retriever_mod.get_retriever()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # one pooled client for every upstream call made by the async tools
+    http_client.open_async_client()
+    fx_tool.start_refresher()  # FX snapshot refreshed off the request path
+    await asyncio.to_thread(retriever_mod.warm_up, WARMUP_BUDGET_S)
+    try:
+        yield
+    finally:
+        fx_tool.stop_refresher()
+        ingest_jobs.shutdown()
+        await http_client.close_async_client()
+
+app = FastAPI(title="Travel Concierge API", version="0.1.0", lifespan=lifespan)
+
+@app.middleware("http")
+async def observe_latency(request: Request, call_next):
+    t0 = time.perf_counter()
+    response = await call_next(request)
+    # route template, not the raw path, so job ids don't explode the label set
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    metrics.HTTP_SECONDS.labels(route, request.method, str(response.status_code)).observe(time.perf_counter() - t0)
+    return response
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(metrics.exposition(), media_type=metrics.CONTENT_TYPE)
 
 @app.get("/health")
 def health():
-    return {"ok": True, "vectorstore_exists": os.path.exists(PERSIST_DIR)}
+    # 503 until the retriever is loaded so readiness probes hold traffic back
+    ready = retriever_mod.is_ready()
+    body = {"ok": True, "ready": ready, "retriever": retriever_mod.status(),
+            "vectorstore_exists": os.path.exists(PERSIST_DIR)}
+    return JSONResponse(body, status_code=200 if ready else 503)
 
-@app.post("/ingest")
-def ingest_endpoint():
-    # Run ingestion as a subroutine
+@app.post("/ingest", status_code=202)
+def ingest_endpoint(full: bool = False):
+    # Runs in the background, one job at a time per collection; poll /ingest/{job_id}
     from .rag import ingest as ingest_mod
-    ingest_mod.main()
-    return {"status": "ok"}
+    job = ingest_jobs.submit(ingest_mod.COLLECTION, ingest_mod.main, incremental=ingest_mod.INCREMENTAL and not full,
+                             lock_path=os.path.join(PERSIST_DIR, ".ingest.lock"))
+    return job.to_dict()
+
+@app.get("/ingest")
+def ingest_jobs_list():
+    return {"jobs": [j.to_dict() for j in ingest_jobs.list()]}
+
+@app.get("/ingest/{job_id}")
+def ingest_status(job_id: str):
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown ingest job.")
+    return job.to_dict()
 
 @app.post("/plan", response_model=TripPlan)
-def plan(req: TripRequest):
+async def plan(req: TripRequest, response: Response, trace: bool = False):
     if not os.path.exists(PERSIST_DIR):
         raise HTTPException(status_code=400, detail="Vector store not found. Run /ingest first.")
 
-    # initial state
-    state = TripState(**req.model_dump())
+    if trace:
+        # traced requests always run the graph, otherwise there'd be nothing to trace
+        tr = metrics.start_trace()
+        out = _to_plan(await app_graph.ainvoke(TripState(**req.model_dump())))
+        out.trace, out.cache = tr.spans, "miss"
+        response.headers["Server-Timing"] = tr.server_timing()
+        return out
 
-    # run the graph
-    result = app_graph.invoke(state)
+    async def run():
+        # initial state
+        state = TripState(**req.model_dump())
+        # run the graph
+        result = await app_graph.ainvoke(state)
+        return _to_plan(result).model_dump(exclude={"trace", "cache"})
 
+    cached, source = await plan_cache.get_or_run(await plan_key(req.model_dump()), run)
+    response.headers["X-Cache"] = source
+    return TripPlan(**cached, cache=source)
+
+def _to_plan(result) -> TripPlan:
     # 🔧 normalize to TripState no matter what invoke returns
     if isinstance(result, TripState):
         final_state = result
@@ -44,3 +123,70 @@ def plan(req: TripRequest):
         ics_path=final_state.ics_path,
         notes=final_state.working_notes,
     )
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/plan/stream")
+async def plan_stream(req: TripRequest):
+    """Same graph as /plan, as Server-Sent Events: `node` when a step starts,
+    `token` for each chunk of the LLM draft, then the full `plan`."""
+    if not os.path.exists(PERSIST_DIR):
+        raise HTTPException(status_code=400, detail="Vector store not found. Run /ingest first.")
+    state = TripState(**req.model_dump())
+
+    async def events():
+        try:
+            async for ev in app_graph.astream_events(state, version="v2"):
+                kind = ev["event"]
+                if kind == "on_chat_model_stream":
+                    text = ev["data"]["chunk"].content
+                    if text:
+                        yield _sse("token", {"text": text})
+                elif kind == "on_chain_start" and ev["name"] != "__start__" and \
+                        any(t.startswith("graph:step:") for t in ev.get("tags", [])):
+                    yield _sse("node", {"name": ev["name"]})
+                elif kind == "on_chain_end" and not ev.get("parent_ids"):
+                    yield _sse("plan", _to_plan(ev["data"]["output"]).model_dump())
+        except Exception as e:
+            yield _sse("error", {"detail": f"{type(e).__name__}: {e}"})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/plan/batch")
+async def plan_batch(reqs: List[TripRequest]):
+    """Many trips in one call, streamed back as NDJSON in completion order:
+    {"index": i, "plan": {...}} or {"index": i, "error": "..."} per line."""
+    if not os.path.exists(PERSIST_DIR):
+        raise HTTPException(status_code=400, detail="Vector store not found. Run /ingest first.")
+    if len(reqs) > BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX} trips per batch.")
+    states = [TripState(**r.model_dump()) for r in reqs]
+
+    async def lines():
+        await aprewarm(states)
+        async for i, res in app_graph.abatch_as_completed(
+                states, config={"max_concurrency": BATCH_CONCURRENCY}, return_exceptions=True):
+            if isinstance(res, Exception):
+                row = {"index": i, "error": f"{type(res).__name__}: {res}"}
+            else:
+                row = {"index": i, "plan": _to_plan(res).model_dump()}
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.get("/plans/{trip_id}/calendar.ics")
+def plan_calendar(trip_id: str, request: Request):
+    hit = ics_tool.store.get(trip_id)
+    if hit is None:
+        raise HTTPException(status_code=404, detail="Unknown trip, or its calendar has expired.")
+    digest, body = hit
+    etag = f'"{digest}"'
+    # content-addressed, so the bytes behind an ETag never change
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=31536000, immutable"}
+    inm = request.headers.get("if-none-match", "")
+    if inm.strip() == "*" or etag in [t.strip().removeprefix("W/") for t in inm.split(",")]:
+        return Response(status_code=304, headers=headers)
+    headers["Content-Disposition"] = f'attachment; filename="trip-{trip_id}.ics"'
+    return Response(body, media_type="text/calendar; charset=utf-8", headers=headers)
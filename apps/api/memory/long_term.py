@@ -1,28 +1,165 @@
-import json, os
-from typing import Dict, Any
+"""User preference store.
 
+PREFS_BACKEND=sqlite (default) keeps one row per user in a WAL-mode database, so
+a read or write touches a single keyed row and concurrent workers can't clobber
+each other; the first open imports the legacy user_prefs.json. PREFS_BACKEND=json
+is the original whole-file store. Either way reads go through a small
+in-process cache.
+"""
+import copy, json, os, sqlite3, threading, time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+PREFS_BACKEND = os.getenv("PREFS_BACKEND", "sqlite")  # "sqlite" | "json"
 MEM_PATH = os.path.join(os.path.dirname(__file__), "user_prefs.json")
+DB_PATH = os.getenv("PREFS_DB_PATH", os.path.join(os.path.dirname(__file__), "user_prefs.sqlite3"))
+CACHE_SIZE = int(os.getenv("PREFS_CACHE_SIZE", "10000"))
+CACHE_TTL_S = float(os.getenv("PREFS_CACHE_TTL_S", "30"))  # bounds staleness from other workers' writes
+
+class JsonBackend:
+    """The original store: the whole file is read and rewritten on every call."""
+
+    def __init__(self, path: str = MEM_PATH):
+        self.path = path
+        self._lock = threading.Lock()  # upserts are read-modify-write
+
+    def _read(self) -> Dict[str, Any]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _write(self, data: Dict[str, Any]):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+
+    def get(self, user: str) -> Dict[str, Any]:
+        return self._read().get(user, {})
+
+    def upsert(self, user: str, prefs: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            data = self._read()
+            cur = data.get(user, {})
+            cur.update(prefs)
+            data[user] = cur
+            self._write(data)
+            return cur
+
+class SqliteBackend:
+    def __init__(self, path: str = DB_PATH, legacy_json: Optional[str] = MEM_PATH):
+        self.path = path
+        self._local = threading.local()  # one connection per thread
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        db = self._conn()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS prefs ("
+            " user TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL) WITHOUT ROWID"
+        )
+        db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        if legacy_json:
+            self._migrate(db, legacy_json)
+
+    def _conn(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # autocommit; writes open their own IMMEDIATE transaction
+            db = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")  # durable enough under WAL, far fewer fsyncs
+            self._local.db = db
+        return db
+
+    def _migrate(self, db: sqlite3.Connection, legacy_json: str):
+        # one-time import; the meta row makes it idempotent across workers and restarts
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if db.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone() is None:
+                data = JsonBackend(legacy_json)._read()
+                now = time.time()
+                db.executemany(
+                    "INSERT OR IGNORE INTO prefs (user, data, updated_at) VALUES (?, ?, ?)",
+                    [(user, json.dumps(p, ensure_ascii=False), now) for user, p in data.items()],
+                )
+                db.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (str(len(data)),))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def get(self, user: str) -> Dict[str, Any]:
+        row = self._conn().execute("SELECT data FROM prefs WHERE user = ?", (user,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def upsert(self, user: str, prefs: Dict[str, Any]) -> Dict[str, Any]:
+        db = self._conn()
+        db.execute("BEGIN IMMEDIATE")  # takes the write lock, so the merge can't interleave
+        try:
+            row = db.execute("SELECT data FROM prefs WHERE user = ?", (user,)).fetchone()
+            cur = json.loads(row[0]) if row else {}
+            cur.update(prefs)
+            db.execute(
+                "INSERT OR REPLACE INTO prefs (user, data, updated_at) VALUES (?, ?, ?)",
+                (user, json.dumps(cur, ensure_ascii=False), time.time()),
+            )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return cur
+
+class CachedPrefs:
+    """Read-through LRU in front of a backend; writes go through and refresh the entry."""
+
+    def __init__(self, backend, size: int = CACHE_SIZE, ttl_s: float = CACHE_TTL_S):
+        self.backend, self.size, self.ttl_s = backend, size, ttl_s
+        self._lock = threading.Lock()
+        self._lru: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()  # user -> (prefs, expires_at)
+        self.hits = self.misses = 0
+
+    def _remember(self, user: str, prefs: Dict[str, Any]):
+        with self._lock:
+            self._lru[user] = (prefs, time.time() + self.ttl_s)
+            self._lru.move_to_end(user)
+            while len(self._lru) > self.size:
+                self._lru.popitem(last=False)
+
+    def get(self, user: str) -> Dict[str, Any]:
+        with self._lock:
+            hit = self._lru.get(user)
+            if hit and hit[1] > time.time():
+                self._lru.move_to_end(user)
+                self.hits += 1
+                return copy.deepcopy(hit[0])
+            self.misses += 1
+        prefs = self.backend.get(user)
+        self._remember(user, prefs)
+        return copy.deepcopy(prefs)
+
+    def upsert(self, user: str, prefs: Dict[str, Any]):
+        self._remember(user, self.backend.upsert(user, prefs))
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
 
-def _read() -> Dict[str, Any]:
-    if not os.path.exists(MEM_PATH):
-        return {}
-    try:
-        with open(MEM_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+_lock = threading.Lock()
+_store: Optional[CachedPrefs] = None
 
-def _write(data: Dict[str, Any]):
-    os.makedirs(os.path.dirname(MEM_PATH), exist_ok=True)
-    with open(MEM_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
+def store() -> CachedPrefs:
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                backend = JsonBackend() if PREFS_BACKEND == "json" else SqliteBackend()
+                _store = CachedPrefs(backend)
+    return _store
 
 def get_prefs(user: str) -> Dict[str, Any]:
-    return _read().get(user, {})
+    return store().get(user)
 
 def upsert_prefs(user: str, prefs: Dict[str, Any]):
-    data = _read()
-    cur = data.get(user, {})
-    cur.update(prefs)
-    data[user] = cur
-    _write(data)
+    store().upsert(user, prefs)
@@ -0,0 +1,169 @@
+# apps/api/metrics.py
+"""Prometheus metrics and optional per-request trace spans.
+
+Graph nodes are wrapped with `node(...)` at registration and outbound calls go
+through `tool(...)` / `record_tool(...)`, which feed latency histograms and
+error counters. Cache hit/miss counts are read from the caches' own stats at
+scrape time, so lookups pay nothing extra. When a request asks for a trace,
+the same hooks also append spans (name, start, duration, error) to it.
+"""
+import functools, os, time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.runnables import RunnableLambda
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+NODE_SECONDS = Histogram("concierge_node_seconds", "Graph node latency", ["node"], buckets=LATENCY_BUCKETS)
+NODE_ERRORS = Counter("concierge_node_errors_total", "Graph node exceptions", ["node"])
+TOOL_SECONDS = Histogram("concierge_tool_seconds", "Outbound tool call latency", ["tool"], buckets=LATENCY_BUCKETS)
+TOOL_ERRORS = Counter("concierge_tool_errors_total", "Failed tool calls", ["tool", "kind"])  # kind: error | timeout
+RETRIEVAL_RESULTS = Histogram("concierge_retrieval_results", "Items returned per research lookup", ["source"],
+                              buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200))
+HTTP_SECONDS = Histogram("concierge_http_request_seconds", "Request latency by route", ["route", "method", "status"],
+                         buckets=LATENCY_BUCKETS)
+
+# ---------- traces ----------
+class Trace:
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+
+    def add(self, name: str, kind: str, started: float, seconds: float, error: Optional[str] = None):
+        self.spans.append({"name": name, "kind": kind, "start_ms": round((started - self.t0) * 1000, 1),
+                           "duration_ms": round(seconds * 1000, 1), **({"error": error} if error else {})})
+
+    def server_timing(self) -> str:
+        # Server-Timing header: shows up in browser devtools and most HTTP clients
+        return ", ".join(f"{s['kind']}-{s['name']};dur={s['duration_ms']}" for s in self.spans)
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("concierge_trace", default=None)
+
+def start_trace() -> Trace:
+    tr = Trace()
+    _trace.set(tr)
+    return tr
+
+def _span(name: str, kind: str, started: float, seconds: float, error: Optional[str] = None):
+    tr = _trace.get()
+    if tr is not None:
+        tr.add(name, kind, started, seconds, error)
+
+# ---------- nodes ----------
+def _observe_node(name: str, t0: float, error: Optional[BaseException]):
+    took = time.perf_counter() - t0
+    NODE_SECONDS.labels(name).observe(took)
+    if error is not None:
+        NODE_ERRORS.labels(name).inc()
+    _span(name, "node", t0, took, f"{type(error).__name__}: {error}" if error is not None else None)
+
+def node(name: str, func: Callable, afunc: Optional[Callable] = None):
+    """Instrumented graph node; keeps an async twin when there is one."""
+    @functools.wraps(func)
+    def run(state):
+        t0 = time.perf_counter()
+        try:
+            out = func(state)
+        except BaseException as e:
+            _observe_node(name, t0, e)
+            raise
+        _observe_node(name, t0, None)
+        return out
+    if afunc is None:
+        return run
+
+    @functools.wraps(afunc)
+    async def arun(state):
+        t0 = time.perf_counter()
+        try:
+            out = await afunc(state)
+        except BaseException as e:
+            _observe_node(name, t0, e)
+            raise
+        _observe_node(name, t0, None)
+        return out
+    return RunnableLambda(run, afunc=arun, name=name)
+
+# ---------- tools ----------
+def record_tool(name: str, started: float, seconds: float, error: Optional[str] = None):
+    """For calls timed elsewhere (the research fan-out); `started` is a perf_counter value."""
+    TOOL_SECONDS.labels(name).observe(seconds)
+    if error:
+        TOOL_ERRORS.labels(name, "timeout" if error.startswith("timeout") else "error").inc()
+    _span(name, "tool", started, seconds, error)
+
+@contextmanager
+def tool(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record_tool(name, t0, time.perf_counter() - t0, f"{type(e).__name__}: {e}")
+        raise
+    record_tool(name, t0, time.perf_counter() - t0)
+
+def observe_results(source: str, n: int):
+    RETRIEVAL_RESULTS.labels(source).observe(n)
+
+# ---------- caches ----------
+class CacheCollector:
+    """Hit/miss counters read from each cache's own stats at scrape time.
+
+    The caches live in this process, so with several workers the values are the
+    scraped worker's own; `per_worker` adds a `pid` label to keep them apart.
+    """
+
+    def __init__(self, per_worker: bool = False):
+        self.per_worker = per_worker
+
+    def _family(self) -> CounterMetricFamily:
+        labels = ["cache", "result"] + (["pid"] if self.per_worker else [])
+        return CounterMetricFamily("concierge_cache_lookups", "Cache lookups by result", labels=labels)
+
+    def describe(self):
+        # lets the registry learn the metric name without collecting at import time
+        yield self._family()
+
+    def collect(self):
+        from . import llm
+        from .plan_cache import plan_cache
+        from .memory import long_term as memory
+        from .rag import retriever
+        from .tools import geocode, weather
+        fam = self._family()
+        g = geocode.stats()
+        w = weather.forecast_cache_stats()
+        rows = {
+            "llm": (llm.response_cache.hits, llm.response_cache.misses),
+            "plan": (plan_cache.hits + plan_cache.coalesced, plan_cache.misses),
+            "geocode": (g["hits"] + g["disk_hits"] + g["negative_hits"] + g["coalesced"], g["misses"]),
+            "forecast_day": (w["day_hits"], w["day_misses"]),
+        }
+        if memory._store is not None:
+            rows["prefs"] = (memory._store.hits, memory._store.misses)
+        if retriever.is_ready():
+            e = retriever.get_retriever().encoder.stats()
+            rows["query_vector"] = (e["hits"], e["misses"])
+        pid = [str(os.getpid())] if self.per_worker else []
+        for cache, (hits, misses) in rows.items():
+            fam.add_metric([cache, "hit"] + pid, hits)
+            fam.add_metric([cache, "miss"] + pid, misses)
+        yield fam
+
+REGISTRY.register(CacheCollector())
+
+def exposition() -> bytes:
+    """Text format for /metrics; merges worker processes when PROMETHEUS_MULTIPROC_DIR is set."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(CacheCollector(per_worker=True))  # in-process, not in the shared files
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
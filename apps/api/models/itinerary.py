@@ -0,0 +1,94 @@
+# apps/api/models/itinerary.py
+"""Structured itinerary passed between graph nodes.
+
+days -> slots -> references into a shared POI list. Nodes edit this directly;
+markdown is produced once, by `render`, in finalize (and for the LLM prompt).
+LLM output is parsed back with `from_markdown` once, right after the draft.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+@dataclass(slots=True)
+class Poi:
+    name: str
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    category: Optional[str] = None
+    source: Optional[str] = None
+
+@dataclass(slots=True)
+class Slot:
+    text: str
+    poi: Optional[int] = None  # index into Itinerary.pois; None for free text from the LLM
+
+@dataclass(slots=True)
+class Day:
+    number: int
+    slots: List[Slot] = field(default_factory=list)
+    weather: Optional[str] = None
+    title: str = ""  # anything after "Day N:" on the heading line
+
+    def render(self) -> str:
+        lines = [f"Day {self.number}:{' ' + self.title if self.title else ''}"]
+        lines += [f"- {s.text}" for s in self.slots]
+        if self.weather:
+            lines.append(f"- Weather: {self.weather}")
+        return "\n".join(lines)
+
+@dataclass(slots=True)
+class Itinerary:
+    city: str
+    days: List[Day] = field(default_factory=list)
+    pois: List[Poi] = field(default_factory=list)
+
+    @classmethod
+    def from_days(cls, city: str, pois: List[Poi], days: List[List[int]], weather_lines: List[str]) -> "Itinerary":
+        """Build from per-day POI indices (see scheduler.schedule) plus one forecast line per day."""
+        it = cls(city=city, pois=list(pois))
+        for d, idx in enumerate(days):
+            day = Day(number=d + 1, slots=[Slot(pois[i].name, i) for i in idx])
+            if weather_lines:
+                day.weather = weather_lines[min(d, len(weather_lines) - 1)]
+            it.days.append(day)
+        return it
+
+    def render(self) -> str:
+        return "\n\n".join([f"# Itinerary for {self.city}"] + [d.render() for d in self.days]) + "\n"
+
+    def poi_for(self, slot: Slot) -> Optional[Poi]:
+        return self.pois[slot.poi] if slot.poi is not None else None
+
+    def from_markdown(self, text: str) -> Optional["Itinerary"]:
+        """Parse an LLM draft onto this itinerary's POI list; None if it has no "Day N" headings."""
+        by_name: Dict[str, int] = {_key(p.name): i for i, p in enumerate(self.pois)}
+        days: List[Day] = []
+        for line in text.splitlines():
+            m = _DAY.match(line)
+            if m:
+                days.append(Day(number=len(days) + 1, title=_clean(m.group(2))))
+                continue
+            b = _BULLET.match(line)
+            if not b or not days:
+                continue
+            item = _clean(b.group(1))
+            if not item:
+                continue
+            if item.lower().startswith("weather:"):
+                days[-1].weather = item.split(":", 1)[1].strip()
+            else:
+                days[-1].slots.append(Slot(item, by_name.get(_key(item))))
+        if not days:
+            return None
+        return Itinerary(city=self.city, days=days, pois=self.pois)
+
+_DAY = re.compile(r"^[\s#*_>]*day\s+(\d+)\b\s*[:.\-–—]?\s*(.*)$", re.IGNORECASE)
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+(.*)$")
+
+def _clean(s: str) -> str:
+    return s.strip().strip("*_").strip()
+
+def _key(name: str) -> str:
+    return " ".join(name.split()).casefold()
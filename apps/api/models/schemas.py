@@ -17,6 +17,8 @@ class TripPlan(BaseModel):
     budget_breakdown: Dict[str, Any]
     ics_path: Optional[str] = None
     notes: Optional[List[str]] = None
+    trace: Optional[List[Dict[str, Any]]] = None  # per-stage spans, when requested with ?trace=true
+    cache: Optional[str] = None  # "hit", "coalesced" (joined an identical in-flight request) or "miss"
 
 class RetrievalChunk(BaseModel):
     content: str
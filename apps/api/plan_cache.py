@@ -0,0 +1,114 @@
+# apps/api/plan_cache.py
+"""Whole-plan cache for /plan with single-flight coalescing.
+
+A plan is a function of the request, the user's stored interests, the forecast
+model run and the FX snapshot, so the key hashes exactly those. Entries expire
+after PLAN_CACHE_TTL_S and the least recently used go first once the cached
+JSON passes PLAN_CACHE_MAX_BYTES. Identical requests that arrive while one is
+being planned wait for it instead of running the graph again. The calendar of
+every cached plan is pinned in the ICS store until its entry goes.
+"""
+import asyncio, hashlib, json, os, threading, time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from . import llm
+from .memory import long_term as memory
+from .tools import calendar as ics_tool
+from .tools import fx as fx_tool
+from .tools import weather as weather_tool
+
+TTL_S = float(os.getenv("PLAN_CACHE_TTL_S", "900"))
+MAX_BYTES = int(os.getenv("PLAN_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+def key(req: Dict[str, Any], prefs: Optional[Dict[str, Any]] = None) -> str:
+    """Canonical hash of everything a plan depends on."""
+    if prefs is None:
+        prefs = memory.get_prefs(req["user"])
+    # the graph plans for request + stored interests (see graph._load_prefs), so a
+    # repeat after finalize saved them still gets the same key
+    interests = sorted(set(req.get("interests") or []) | set(prefs.get("interests", [])))
+    payload = {
+        "req": dict(req, interests=interests, city=" ".join(req["city"].split()).casefold(),
+                    currency=req["currency"].upper()),
+        "forecast_run": weather_tool.current_model_run(),
+        "fx_as_of": fx_tool.table.as_of,
+        "model": llm.model_id(),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+async def akey(req: Dict[str, Any]) -> str:
+    """`key` for async handlers: the prefs read (SQLite on a cache miss) runs on a thread."""
+    return key(req, await asyncio.to_thread(memory.get_prefs, req["user"]))
+
+class PlanCache:
+    def __init__(self, ttl_s: float = TTL_S, max_bytes: int = MAX_BYTES):
+        self.ttl_s, self.max_bytes = ttl_s, max_bytes
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, Tuple[Dict[str, Any], float, int]]" = OrderedDict()  # key -> (plan, expires_at, bytes)
+        self._bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = self.misses = self.coalesced = 0
+
+    def get(self, k: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            hit = self._data.get(k)
+            if hit is None:
+                return None
+            if hit[1] <= time.time():
+                self._drop(k)
+                return None
+            self._data.move_to_end(k)
+            return hit[0]
+
+    def _drop(self, k: str):
+        # caller holds _lock
+        plan, _, size = self._data.pop(k)
+        self._bytes -= size
+        ics_tool.store.unpin(plan.get("trip_id"))
+
+    def put(self, k: str, plan: Dict[str, Any]):
+        size = len(json.dumps(plan, default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if k in self._data:
+                self._drop(k)
+            self._data[k] = (plan, time.time() + self.ttl_s, size)
+            self._bytes += size
+            # a cached plan's calendar_url must keep working for as long as it can be served
+            ics_tool.store.pin(plan.get("trip_id"))
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._data)))
+
+    async def get_or_run(self, k: str, run: Callable[[], Awaitable[Dict[str, Any]]]) -> Tuple[Dict[str, Any], str]:
+        """(plan, "hit" | "coalesced" | "miss"); at most one `run` per key is in flight."""
+        plan = self.get(k)
+        if plan is not None:
+            self.hits += 1
+            return plan, "hit"
+        task = self._inflight.get(k)
+        if task is None:
+            self.misses += 1
+            source = "miss"
+            task = self._inflight[k] = asyncio.ensure_future(self._run(k, run))
+        else:
+            self.coalesced += 1
+            source = "coalesced"
+        # shield: a caller that disconnects must not cancel the run others are waiting on
+        return await asyncio.shield(task), source
+
+    async def _run(self, k: str, run: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        try:
+            plan = await run()
+            self.put(k, plan)
+            return plan
+        finally:
+            self._inflight.pop(k, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._data), "bytes": self._bytes, "hits": self.hits,
+                    "misses": self.misses, "coalesced": self.coalesced}
+
+plan_cache = PlanCache()
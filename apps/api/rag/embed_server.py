@@ -0,0 +1,38 @@
+# apps/api/rag/embed_server.py
+"""Embedding sidecar: one loaded SentenceTransformer shared by every API worker.
+
+Run with a single worker and point the API at it:
+    uvicorn apps.api.rag.embed_server:app --port 8100 --workers 1
+    EMBEDDER_URL=http://127.0.0.1:8100 uvicorn apps.api.main:app --workers 4
+"""
+from contextlib import asynccontextmanager
+from typing import List
+
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+
+from .retriever import EMBED_MODEL
+
+_model = None
+
+class EmbedRequest(BaseModel):
+    texts: List[str]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _model
+    from sentence_transformers import SentenceTransformer
+    _model = SentenceTransformer(EMBED_MODEL)
+    yield
+
+app = FastAPI(title="Travel Concierge Embedder", lifespan=lifespan)
+
+@app.get("/health")
+def health():
+    return {"ok": _model is not None, "model": EMBED_MODEL}
+
+@app.post("/embed")
+async def embed(req: EmbedRequest):
+    vectors = await run_in_threadpool(_model.encode, req.texts)
+    return {"vectors": [v.tolist() for v in vectors]}
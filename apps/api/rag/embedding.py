@@ -0,0 +1,167 @@
+# apps/api/rag/embedding.py
+"""Document-side embedding for ingest, spread over CPU worker processes.
+
+Each worker loads the model once and runs with a few intra-op threads, so a
+many-core box runs several encoders side by side instead of one. Texts are
+sorted by length and cut into micro-batches before they're handed out, so a
+batch pads to its own longest text rather than the longest in the corpus.
+
+Backends: "torch" (sentence-transformers), "onnx" (onnxruntime on the model's
+ONNX export) and "onnx-int8" (the same graph dynamically quantized to int8,
+made once and cached next to the download). The ONNX backends need
+`pip install onnxruntime`.
+"""
+from __future__ import annotations
+
+import multiprocessing, os, threading, time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .retriever import EMBED_MODEL
+
+EMBED_BACKEND = os.getenv("INGEST_EMBED_BACKEND", "torch")      # "torch" | "onnx" | "onnx-int8"
+EMBED_WORKERS = os.getenv("INGEST_EMBED_WORKERS", "auto")       # processes; "auto" = cores / threads
+EMBED_THREADS = int(os.getenv("INGEST_EMBED_THREADS", "2"))     # intra-op threads per worker
+MICRO_BATCH = int(os.getenv("INGEST_EMBED_MICRO_BATCH", "32"))  # texts per encode call
+MAX_SEQ = 256  # all-MiniLM-L6-v2 truncates here
+ONNX_FILE = "onnx/model.onnx"
+
+def worker_count(setting: str = EMBED_WORKERS, threads: int = EMBED_THREADS) -> int:
+    if setting == "auto":
+        return max(1, (os.cpu_count() or 1) // max(threads, 1))
+    return max(1, int(setting))
+
+def buckets(texts: List[str], size: int, by_length: bool = True) -> List[List[int]]:
+    """Index groups of at most `size`, neighbours in length when `by_length`."""
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i])) if by_length else list(range(len(texts)))
+    return [order[i:i + size] for i in range(0, len(order), size)]
+
+# ---------- ONNX ----------
+def onnx_path(model_name: str = EMBED_MODEL, quantized: bool = False) -> str:
+    """Local path of the model's ONNX graph; the int8 copy is made on first use."""
+    from huggingface_hub import hf_hub_download
+    path = hf_hub_download(f"sentence-transformers/{model_name}", ONNX_FILE)
+    if not quantized:
+        return path
+    q = os.path.join(os.path.dirname(path), "model.int8.onnx")
+    if not os.path.exists(q):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        tmp = f"{q}.{os.getpid()}.tmp"
+        quantize_dynamic(path, tmp, weight_type=QuantType.QInt8)
+        os.replace(tmp, q)
+    return q
+
+class OnnxEncoder:
+    """SentenceTransformer-compatible `encode`: tokenizer -> ONNX graph -> mean pooling."""
+
+    def __init__(self, model_name: str = EMBED_MODEL, quantized: bool = False, threads: int = EMBED_THREADS):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = threads
+        opts.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(onnx_path(model_name, quantized), opts,
+                                            providers=["CPUExecutionProvider"])
+        self.inputs = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(f"sentence-transformers/{model_name}")
+
+    def encode(self, sentences, normalize_embeddings: bool = False, **_):
+        single = isinstance(sentences, str)
+        enc = self.tokenizer([sentences] if single else list(sentences), padding=True, truncation=True,
+                             max_length=MAX_SEQ, return_tensors="np")
+        hidden = self.session.run(None, {k: v.astype(np.int64) for k, v in enc.items() if k in self.inputs})[0]
+        mask = enc["attention_mask"][..., None].astype(np.float32)
+        vecs = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if normalize_embeddings:
+            vecs /= np.clip(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12, None)
+        return vecs[0] if single else vecs
+
+def load_model(backend: str = EMBED_BACKEND, model_name: str = EMBED_MODEL, threads: int = EMBED_THREADS):
+    if backend == "torch":
+        import torch
+        from sentence_transformers import SentenceTransformer
+        torch.set_num_threads(threads)
+        return SentenceTransformer(model_name, device="cpu")
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEncoder(model_name, quantized=backend == "onnx-int8", threads=threads)
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
+# ---------- worker processes ----------
+_model = None
+
+def _init_worker(backend: str, model_name: str, threads: int):
+    global _model
+    os.environ["OMP_NUM_THREADS"] = str(threads)  # before torch/onnxruntime size their pools
+    _model = load_model(backend, model_name, threads)
+
+def _ready(_) -> int:
+    return os.getpid()
+
+def _encode(texts: List[str]) -> np.ndarray:
+    return np.asarray(_model.encode(texts, batch_size=len(texts), normalize_embeddings=True,
+                                    convert_to_numpy=True), dtype=np.float32)
+
+class EmbeddingEngine:
+    """`embed_documents` for the ingest pipeline, on one process or a pool of them."""
+
+    def __init__(self, backend: str = EMBED_BACKEND, workers: Optional[int] = None, threads: int = EMBED_THREADS,
+                 micro_batch: int = MICRO_BATCH, by_length: bool = True, model_name: str = EMBED_MODEL):
+        self.backend, self.threads, self.micro_batch, self.by_length = backend, threads, micro_batch, by_length
+        self.workers = workers or worker_count(threads=threads)
+        self._lock = threading.Lock()
+        self.chunks, self.seconds = 0, 0.0
+        t0 = time.perf_counter()
+        if backend.startswith("onnx"):
+            onnx_path(model_name, quantized=backend == "onnx-int8")  # download/quantize once, not per worker
+        self._model = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        if self.workers > 1:
+            # spawn: forking a process that has torch's thread pools up can deadlock
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_worker, initargs=(backend, model_name, threads))
+            list(self._pool.map(_ready, range(self.workers)))  # start them all now, so load time isn't throughput
+        else:
+            self._model = load_model(backend, model_name, threads)
+        self.load_s = time.perf_counter() - t0
+
+    @property
+    def batch_hint(self) -> int:
+        # pipeline batch big enough to give every worker a couple of micro-batches
+        return self.workers * self.micro_batch * 2
+
+    def _encode_local(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self._model.encode(texts, batch_size=len(texts), normalize_embeddings=True,
+                                             convert_to_numpy=True), dtype=np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        t0 = time.perf_counter()
+        groups = buckets(texts, self.micro_batch, self.by_length)
+        work = [[texts[i] for i in g] for g in groups]
+        parts = self._pool.map(_encode, work) if self._pool else map(self._encode_local, work)
+        out: List[Any] = [None] * len(texts)
+        for g, vecs in zip(groups, parts):
+            for i, v in zip(g, vecs):
+                out[i] = v.tolist()
+        with self._lock:
+            self.chunks += len(texts)
+            self.seconds += time.perf_counter() - t0
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": self.backend, "workers": self.workers, "threads": self.threads,
+                    "chunks": self.chunks, "seconds": round(self.seconds, 3), "load_s": round(self.load_s, 3),
+                    "chunks_per_s": round(self.chunks / self.seconds, 1) if self.seconds else None}
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def __enter__(self) -> "EmbeddingEngine":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
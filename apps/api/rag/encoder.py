@@ -0,0 +1,121 @@
+# apps/api/rag/encoder.py
+"""Query-side encoding: an LRU of query vectors plus micro-batching.
+
+Searches that arrive within `max_wait_ms` of each other are encoded together in
+one `encode([...])` call, so per-call model overhead is paid once per batch
+instead of once per request.
+
+The batching thread is started on first use in each process, so a retriever
+loaded before a fork (`gunicorn --preload`) gets its own thread in every worker.
+"""
+import os, queue, threading, time, weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, List, Tuple
+
+CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "4096"))
+MAX_BATCH = int(os.getenv("QUERY_BATCH_MAX", "32"))
+MAX_WAIT_MS = float(os.getenv("QUERY_BATCH_WAIT_MS", "3"))
+TIMEOUT_S = float(os.getenv("QUERY_ENCODE_TIMEOUT_S", "30"))  # a stuck model fails the search, not the thread
+
+def normalize(text: str) -> str:
+    # MiniLM is uncased, so case and spacing don't change the vector
+    return " ".join(text.split()).casefold()
+
+class BatchingEncoder:
+    def __init__(self, model, max_batch: int = MAX_BATCH, max_wait_ms: float = MAX_WAIT_MS,
+                 cache_size: int = CACHE_SIZE):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Any]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "batches": 0, "encoded": 0}
+        self._reset()
+        # a forked child inherits the queue and maybe a held lock, but not the thread
+        ref = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: ref() and ref()._reset())
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._q: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._worker = None
+
+    def _submit(self, items: List[Tuple[str, Future]]):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._loop, args=(self._q,), name="query-encoder", daemon=True)
+                self._worker.start()
+        for item in items:
+            self._q.put(item)
+
+    def encode(self, text: str):
+        key = normalize(text)
+        with self._lock:
+            vec = self._cache.get(key)
+            if vec is not None:
+                self._cache.move_to_end(key)
+                self._stats["hits"] += 1
+                return vec
+            self._stats["misses"] += 1
+        fut: Future = Future()
+        self._submit([(key, fut)])
+        return fut.result(timeout=TIMEOUT_S)
+
+    def encode_many(self, texts: List[str]) -> List[Any]:
+        """Queue all uncached texts at once so they share batches."""
+        futs: List[Tuple[str, Future]] = []
+        out: Dict[str, Any] = {}
+        with self._lock:
+            for key in dict.fromkeys(normalize(t) for t in texts):
+                vec = self._cache.get(key)
+                if vec is not None:
+                    self._cache.move_to_end(key)
+                    self._stats["hits"] += 1
+                    out[key] = vec
+                else:
+                    self._stats["misses"] += 1
+                    futs.append((key, Future()))
+        self._submit(futs)
+        deadline = time.monotonic() + TIMEOUT_S
+        for key, fut in futs:
+            out[key] = fut.result(timeout=max(deadline - time.monotonic(), 0))
+        return [out[normalize(t)] for t in texts]
+
+    def _collect(self, q: queue.Queue) -> List[Tuple[str, Future]]:
+        batch = [q.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(q.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self, q: queue.Queue):
+        while True:
+            batch = self._collect(q)
+            texts = list(dict.fromkeys(key for key, _ in batch))  # identical queries encode once
+            try:
+                vectors = dict(zip(texts, self.model.encode(texts)))
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            with self._lock:
+                self._stats["batches"] += 1
+                self._stats["encoded"] += len(texts)
+                for key, vec in vectors.items():
+                    self._cache[key] = vec
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            for key, fut in batch:
+                fut.set_result(vectors[key])
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, size=len(self._cache))
@@ -0,0 +1,120 @@
+# apps/api/rag/fetch.py
+"""Polite concurrent fetching for ingestion.
+
+Each upstream host gets a token bucket (requests/second + burst) and a cap on
+in-flight requests, so raising INGEST_FETCH_WORKERS scales throughput across
+hosts without hammering any single one. Transient failures (429/5xx, network
+errors) are retried with exponential backoff, honouring Retry-After.
+"""
+from __future__ import annotations
+
+import os, random, threading, time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, TypeVar
+from urllib.parse import urlparse
+
+import requests
+
+from ..tools import http_client
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+FETCH_WORKERS = int(os.getenv("INGEST_FETCH_WORKERS", "8"))
+RETRIES = int(os.getenv("INGEST_FETCH_RETRIES", "4"))
+BACKOFF_S = 1.0
+
+# host -> (requests per second, burst, max in flight)
+HOST_LIMITS: Dict[str, Tuple[float, int, int]] = {
+    "en.wikivoyage.org": (5.0, 5, 4),
+    "en.wikipedia.org": (5.0, 5, 4),
+    "overpass-api.de": (0.5, 1, 2),      # Overpass allows ~2 slots per IP
+    "geocoding-api.open-meteo.com": (10.0, 10, 8),
+}
+DEFAULT_LIMIT = (2.0, 2, 2)
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+_hosts_lock = threading.Lock()
+_hosts: Dict[str, Tuple[TokenBucket, threading.Semaphore]] = {}
+
+def _host(host: str) -> Tuple[TokenBucket, threading.Semaphore]:
+    with _hosts_lock:
+        if host not in _hosts:
+            rate, burst, inflight = HOST_LIMITS.get(host, DEFAULT_LIMIT)
+            _hosts[host] = (TokenBucket(rate, burst), threading.Semaphore(inflight))
+        return _hosts[host]
+
+@contextmanager
+def throttle(host: str):
+    """Hold a rate-limit token and an in-flight slot for `host`."""
+    bucket, slots = _host(host)
+    with slots:
+        bucket.acquire()
+        yield
+
+def _retry_after(r: requests.Response) -> float | None:
+    try:
+        return float(r.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+def request(method: str, url: str, retries: int = RETRIES, **kwargs) -> requests.Response:
+    """Rate-limited request with retries; raises on the final failure."""
+    host = urlparse(url).netloc
+    kwargs.setdefault("timeout", 40)
+    for attempt in range(retries + 1):
+        delay = BACKOFF_S * (2 ** attempt) * (0.5 + random.random())
+        try:
+            with throttle(host):
+                r = http_client.session().request(method, url, **kwargs)
+            if r.status_code != 429 and r.status_code < 500:
+                r.raise_for_status()
+                return r
+            if attempt == retries:
+                r.raise_for_status()
+            delay = _retry_after(r) or delay
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+        time.sleep(delay)
+    raise RuntimeError("unreachable")
+
+def batched(items: List[T], size: int) -> Iterator[List[T]]:
+    for i in range(0, len(items), size):
+        yield items[i:i+size]
+
+def run(fn: Callable[[T], R], items: Iterable[T], workers: int = FETCH_WORKERS) -> Iterator[R]:
+    """Apply `fn` concurrently, yielding results as they complete.
+
+    At most 2 * workers items are in flight, so a slow consumer bounds memory.
+    """
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch") as pool:
+        pending = set()
+        for it in items:
+            pending.add(pool.submit(fn, it))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield fut.result()
+        for fut in as_completed(pending):
+            yield fut.result()
@@ -1,19 +1,24 @@
 # apps/api/rag/ingest.py
 from __future__ import annotations
 
-import os, time, hashlib, requests
+import os, re, sys, hashlib, json, logging, threading, time
 from pathlib import Path
-from typing import List, Iterable, Optional
+from typing import Callable, Dict, List, Iterable, Iterator, Optional
 
-from tqdm import tqdm
+import chromadb
 
 # LangChain bits (works with LC 0.2+)
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.document_loaders import TextLoader, WebBaseLoader, WikipediaLoader
 
+from ..tools import geocode as geocoder
+from . import embedding, fetch, pipeline, poi_index
+from . import lexical, snapshot
+from .retriever import city_key, LEXICAL_DIR
+
+log = logging.getLogger(__name__)
+
 PERSIST_DIR = "vectorstore"
 DATA_DIR = Path("data/guides")
 
@@ -23,6 +28,20 @@ ENABLE_WIKIVOYAGE   = True   # city travel guides (no key)
 ENABLE_WIKIPEDIA    = True   # background pages via WikipediaLoader (no key)
 ENABLE_OVERPASS_OSM = False   # POI names from OpenStreetMap (no key)
 ENABLE_URLS         = False  # scrape arbitrary URLs (no key)
+ENABLE_POI_INDEX    = True   # per-city POI table (OSM + Wikipedia geosearch + guide "See" listings)
+ENABLE_SNAPSHOT     = True   # mmap'd serving snapshot the API swaps in (rag/snapshot.py)
+SNAPSHOT_DTYPE = os.getenv("SNAPSHOT_DTYPE", "float16")  # or "int8": half the size, per-row scales
+
+# Incremental mode keys chunks on _doc_id, embeds only new/changed chunks and
+# drops chunks whose source document is gone. `python -m apps.api.rag.ingest --full`
+# re-embeds everything (still upserting by id, so nothing is duplicated).
+INCREMENTAL = True
+COLLECTION = "guides"
+EMBED_MODEL = "all-MiniLM-L6-v2"
+CHUNK_SIZE, CHUNK_OVERLAP = 800, 120
+# completed docs of an interrupted run; the next run with the same config resumes from here
+CHECKPOINT_PATH = os.path.join(PERSIST_DIR, ".ingest_checkpoint")
+LAST_RUN_PATH = os.path.join(PERSIST_DIR, ".ingest_last_run.json")  # chunk count, for the next run's ETA
 
 # Cities to fetch from external sources
 CITIES = [
@@ -48,119 +67,143 @@ def _doc_id(text: str, meta: dict) -> str:
         h.update(str(meta["title"]).encode("utf-8"))
     return h.hexdigest()
 
-def _dedupe(docs: Iterable[Document]) -> List[Document]:
-    seen = set()
-    out: List[Document] = []
-    for d in docs:
-        did = _doc_id(d.page_content, d.metadata or {})
-        if did not in seen:
-            seen.add(did)
-            out.append(d)
-    return out
-
 def geocode(city: str) -> Optional[tuple[float, float, str]]:
     """Open-Meteo geocoder (no key). Returns (lat, lon, tz)."""
-    r = requests.get(
-        "https://geocoding-api.open-meteo.com/v1/search",
-        params={"name": city, "count": 1},
-        timeout=20,
-    )
-    r.raise_for_status()
-    js = r.json()
-    if not js.get("results"):
-        return None
-    res = js["results"][0]
-    return float(res["latitude"]), float(res["longitude"]), res.get("timezone", "auto")
+    return geocoder.lookup(city)  # shared cache with the API tools
 API = "https://en.wikivoyage.org/w/api.php"
 HEADERS = {
     # Put something identifying + contact. This matters for Wikimedia.
     "User-Agent": "travel-concierge/0.1 (https://example.com; contact: you@example.com)"
 }
 
-def wikivoyage_docs(cities: List[str]) -> List[Document]:
-    """Fetch plain-text extracts from Wikivoyage (CC BY-SA)."""
-    docs: List[Document] = []
-    API = "https://en.wikivoyage.org/w/api.php"
-    for city in cities:
-        try:
-            params = {
-                "action": "query",
-                "prop": "extracts",
-                "explaintext": 1,
-                "format": "json",
-                "titles": city,
-                "redirects": 1,
-                "formatversion": 2,
-                    }
-            
-            r = requests.get(API, params=params, timeout=30, headers=HEADERS)
-            r.raise_for_status()
-            pages = r.json()["query"]["pages"]
-            text = pages[0]["extract"].strip()
-            if text:
-                docs.append(Document(
-                    page_content=text,
-                    metadata={"source": "wikivoyage", "title": city}
-                ))
-            time.sleep(0.3)  
-        except Exception as e:
-            print("Error:", type(e).__name__, "-", e)
+WIKIVOYAGE_BATCH = 20  # titles per call (TextExtracts caps exlimit at 20)
 
+def _wikivoyage_batch(cities: List[str], failed: Optional[set] = None) -> List[Document]:
+    docs: List[Document] = []
+    params = {
+        "action": "query",
+        "prop": "extracts",
+        "explaintext": 1,
+        "exlimit": "max",
+        "format": "json",
+        "titles": "|".join(cities),
+        "redirects": 1,
+        "formatversion": 2,
+    }
+    back = {c: c for c in cities}  # resolved page title -> requested city
+    seen = set()
+    try:
+        while True:
+            js = fetch.request("GET", API, params=params, headers=HEADERS).json()
+            query = js.get("query", {})
+            for step in query.get("normalized", []) + query.get("redirects", []):
+                back[step["to"]] = back.get(step["from"], step["from"])
+            for page in query.get("pages", []):
+                text = (page.get("extract") or "").strip()
+                if text and page["title"] not in seen:
+                    seen.add(page["title"])
+                    docs.append(Document(
+                        page_content=text,
+                        metadata={"source": "wikivoyage", "title": back.get(page["title"], page["title"]),
+                                  "city": city_key(back.get(page["title"], page["title"]))}
+                    ))
+            # long extracts come back a few pages at a time
+            if "continue" not in js:
+                break
+            params = {**params, **js["continue"]}
+    except Exception as e:
+        log.warning("Wikivoyage batch %s failed: %s: %s", cities, type(e).__name__, e)
+        if failed is not None:
+            failed.update(("wikivoyage", city_key(c)) for c in cities)
     return docs
 
-def wikipedia_docs(cities: List[str]) -> List[Document]:
+def wikivoyage_docs(cities: List[str], failed: Optional[set] = None) -> Iterator[Document]:
+    """Fetch plain-text extracts from Wikivoyage (CC BY-SA), many titles per call.
+
+    Cities whose batch errored are added to `failed` as ("wikivoyage", city key).
+    """
+    for batch in fetch.run(lambda b: _wikivoyage_batch(b, failed), fetch.batched(cities, WIKIVOYAGE_BATCH)):
+        yield from batch
+
+def _wikipedia_one(city: str, failed: Optional[set] = None) -> List[Document]:
+    try:
+        with fetch.throttle("en.wikipedia.org"):
+            docs = WikipediaLoader(query=city, load_max_docs=1, lang="en").load()
+        for d in docs:
+            d.metadata["city"] = city_key(city)
+        return docs
+    except Exception as e:
+        log.warning("Wikipedia fetch for %s failed: %s: %s", city, type(e).__name__, e)
+        if failed is not None:
+            failed.add(("wikipedia", city_key(city)))
+        return []
+
+def wikipedia_docs(cities: List[str], failed: Optional[set] = None) -> Iterator[Document]:
     """Use LangChain WikipediaLoader to pull concise pages."""
-    docs: List[Document] = []
-    for city in cities:
-        try:
-            loader = WikipediaLoader(query=city, load_max_docs=1, lang="en")
-            docs.extend(loader.load())
-            time.sleep(0.2)
-        except Exception as e:
-            print("Error:", type(e).__name__, "-", e)
-    # tag metadata so you can filter later
-    for d in docs:
-        d.metadata.setdefault("source", "wikipedia")
-    return docs
+    for batch in fetch.run(lambda c: _wikipedia_one(c, failed), cities):
+        for d in batch:
+            # tag metadata so you can filter later
+            d.metadata.setdefault("source", "wikipedia")
+            yield d
+
+OVERPASS = "https://overpass-api.de/api/interpreter"
 
-def overpass_poi_docs(cities: List[str], radius_m: int = 3000, per_city_limit: int = 40) -> List[Document]:
+_overpass_lock = threading.Lock()
+_overpass_cache: dict = {}
+
+def overpass_elements(city: str, radius_m: int = 3000, limit: int = 40) -> List[dict]:
+    """Raw tourism/historic elements around the city centre (memoised per run)."""
+    key = (city, radius_m, limit)
+    with _overpass_lock:
+        if key in _overpass_cache:
+            return _overpass_cache[key]
+    with fetch.throttle("geocoding-api.open-meteo.com"):
+        geo = geocode(city)
+    if not geo:
+        return []
+    lat, lon, _tz = geo
+    q = f"""
+    [out:json][timeout:25];
+    (
+      node(around:{radius_m},{lat},{lon})["tourism"];
+      way(around:{radius_m},{lat},{lon})["tourism"];
+      node(around:{radius_m},{lat},{lon})["historic"];
+      way(around:{radius_m},{lat},{lon})["historic"];
+    );
+    out center {limit};
+    """
+    r = fetch.request("POST", OVERPASS, data={"data": q}, timeout=40)
+    elements = r.json().get("elements", [])
+    with _overpass_lock:
+        _overpass_cache[key] = elements
+    return elements
+
+def _overpass_one(city: str, radius_m: int, per_city_limit: int, failed: Optional[set] = None) -> List[Document]:
+    try:
+        names = []
+        for el in overpass_elements(city, radius_m, per_city_limit):
+            name = (el.get("tags") or {}).get("name")
+            if name and name not in names:
+                names.append(name)
+            if len(names) >= per_city_limit:
+                break
+        # Turn each city’s POI list into a small markdown guide
+        if names:
+            text = f"# Points of Interest in {city}\n\n" + "\n".join(f"- {n}" for n in names)
+            return [Document(page_content=text, metadata={"source": "osm_overpass", "title": f"{city} POIs",
+                                                          "city": city_key(city)})]
+    except Exception as e:
+        # an outage must not read as "no POIs"
+        log.warning("Overpass fetch for %s failed: %s: %s", city, type(e).__name__, e)
+        if failed is not None:
+            failed.add(("osm_overpass", city_key(city)))
+    return []
+
+def overpass_poi_docs(cities: List[str], radius_m: int = 3000, per_city_limit: int = 40,
+                      failed: Optional[set] = None) -> Iterator[Document]:
     """Get POI names from OSM (tourism/historic) around city center. No key."""
-    OVERPASS = "https://overpass-api.de/api/interpreter"
-    docs: List[Document] = []
-    for city in cities:
-        try:
-            geo = geocode(city)
-            if not geo:
-                continue
-            lat, lon, _tz = geo
-            q = f"""
-            [out:json][timeout:25];
-            (
-              node(around:{radius_m},{lat},{lon})["tourism"];
-              way(around:{radius_m},{lat},{lon})["tourism"];
-              node(around:{radius_m},{lat},{lon})["historic"];
-              way(around:{radius_m},{lat},{lon})["historic"];
-            );
-            out center {per_city_limit};
-            """
-            r = requests.post(OVERPASS, data={"data": q}, timeout=40)
-            r.raise_for_status()
-            elements = r.json().get("elements", [])
-            names = []
-            for el in elements:
-                name = (el.get("tags") or {}).get("name")
-                if name and name not in names:
-                    names.append(name)
-                if len(names) >= per_city_limit:
-                    break
-            # Turn each city’s POI list into a small markdown guide
-            if names:
-                text = f"# Points of Interest in {city}\n\n" + "\n".join(f"- {n}" for n in names)
-                docs.append(Document(page_content=text, metadata={"source": "osm_overpass", "title": f"{city} POIs"}))
-            time.sleep(0.8)  # be polite to Overpass
-        except Exception:
-            continue
-    return docs
+    for batch in fetch.run(lambda c: _overpass_one(c, radius_m, per_city_limit, failed), cities):
+        yield from batch
 
 def local_md_docs(dirpath: Path) -> List[Document]:
     if not dirpath.exists():
@@ -168,9 +211,12 @@ def local_md_docs(dirpath: Path) -> List[Document]:
     docs: List[Document] = []
     for p in dirpath.glob("*.md"):
         try:
-            docs += TextLoader(str(p), encoding="utf-8").load()
+            loaded = TextLoader(str(p), encoding="utf-8").load()
         except Exception:
             continue
+        for d in loaded:
+            d.metadata["city"] = city_key(p.stem.replace("_", " "))  # data/guides/rome.md -> "rome"
+        docs += loaded
     for d in docs:
         d.metadata.setdefault("source", "local")
     return docs
@@ -184,51 +230,210 @@ def url_docs(urls: List[str]) -> List[Document]:
         d.metadata.setdefault("source", "web")
     return docs
 
-# ---------- main ----------
+# ---------- POI index ----------
 
-def main():
-    # 1) Gather documents from all enabled sources
-    docs: List[Document] = []
+WIKI_API = "https://en.wikipedia.org/w/api.php"
+SIGHT_SECTIONS = ("see", "sights")  # guide headings whose listings are POIs ("Do" lists activities)
+# a listing's name ends at its first ", ", " (", dash or sentence end ("St. Peter's" is not one)
+_LISTING_END = re.compile(r",\s| \(| [—–-] |(?<!\bSt)(?<!\bMt)\.(?:\s|$)")
+_NAME_WORDS = {"of", "the", "and", "a", "di", "de", "del", "della", "dei", "degli", "la", "le", "du", "des", "von", "van", "al", "on"}
+MAX_NAME_WORDS = 8
 
-    if ENABLE_LOCAL_FILES:
-        docs.extend(local_md_docs(DATA_DIR))
+def osm_pois(city: str) -> List[dict]:
+    out = []
+    for el in overpass_elements(city):
+        tags = el.get("tags") or {}
+        if not tags.get("name"):
+            continue
+        center = el.get("center") or el  # ways carry "center", nodes carry lat/lon
+        out.append({"name": tags["name"], "lat": center.get("lat"), "lon": center.get("lon"),
+                    "category": tags.get("tourism") or tags.get("historic")})
+    return out
 
-    if ENABLE_WIKIVOYAGE:
-        docs.extend(wikivoyage_docs(CITIES))
+def wikipedia_pois(city: str, radius_m: int = 3000, limit: int = 50) -> List[dict]:
+    geo = geocode(city)
+    if not geo:
+        return []
+    lat, lon, _tz = geo
+    params = {"action": "query", "list": "geosearch", "gscoord": f"{lat}|{lon}",
+              "gsradius": radius_m, "gslimit": limit, "format": "json"}
+    js = fetch.request("GET", WIKI_API, params=params, headers=HEADERS).json()
+    return [{"name": g["title"], "lat": g.get("lat"), "lon": g.get("lon"), "category": "landmark"}
+            for g in js.get("query", {}).get("geosearch", [])]
 
-    if ENABLE_WIKIPEDIA:
-        docs.extend(wikipedia_docs(CITIES))
+def _heading(line: str) -> Optional[tuple]:
+    """(level, title) for "== See ==" / "=== Museums ===" (Wikivoyage explaintext) or "## See" (markdown)."""
+    m = re.match(r"^(=+)\s*(.*?)\s*=*$", line) if line.startswith("==") else re.match(r"^(#+)\s*(.*)$", line)
+    return (len(m.group(1)), m.group(2).strip().casefold()) if m else None
 
-    if ENABLE_OVERPASS_OSM:
-        docs.extend(overpass_poi_docs(CITIES))
+def _listing_name(line: str) -> Optional[str]:
+    # explaintext listings are plain lines, "Colosseum (Colosseo), Piazza del Colosseo. ☏ ...";
+    # local markdown uses "- Name — blurb" bullets. Prose paragraphs fail the title-case test.
+    if line[:2] in ("- ", "* "):
+        line = line[2:]
+    name = _LISTING_END.split(line, maxsplit=1)[0].strip(" .")
+    name = re.sub(r"^\d+\s+", "", name)  # map-marker number in front of some listings
+    words = name.split()
+    if not words or len(words) > MAX_NAME_WORDS or not name[0].isupper():
+        return None
+    if any(w[0].islower() and w not in _NAME_WORDS for w in words):
+        return None
+    return name
+
+def sight_names(text: str) -> List[str]:
+    """Listing names under "See"/"Sights" headings (and their subsections) of one guide."""
+    out: List[str] = []
+    level = None  # heading level of the sights section we're in, if any
+    for line in (text or "").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        h = _heading(line)
+        if h:
+            if level is not None and h[0] <= level:
+                level = None
+            if level is None and h[1] in SIGHT_SECTIONS:
+                level = h[0]
+            continue
+        if level is not None:
+            name = _listing_name(line)
+            if name and name not in out:
+                out.append(name)
+    return out
 
+def guide_pois(texts: Dict[str, List[str]], collection=None) -> Callable[[str], List[dict]]:
+    """Sights listed in each city's guides.
+
+    `texts` holds this run's whole guide extracts by city key; a "See" section
+    spans several chunks, and only the first has the heading. Cities whose fetch
+    failed fall back to the indexed chunks, read one at a time.
+    """
+    def extract(city: str) -> List[dict]:
+        docs = texts.get(city_key(city))
+        if docs is None and collection is not None:
+            docs = collection.get(where={"city": city_key(city)}, include=["documents"])["documents"]
+        names: List[str] = []
+        for text in docs or []:
+            names += [n for n in sight_names(text) if n not in names]
+        return [{"name": n, "lat": None, "lon": None, "category": "guide"} for n in names]
+    return extract
+
+def _keep_guides(source: Callable[[], Iterable[Document]], texts: Dict[str, List[str]]):
+    # whole documents for guide_pois, as they stream past
+    def run() -> Iterator[Document]:
+        for d in source():
+            texts.setdefault(d.metadata.get("city"), []).append(d.page_content)
+            yield d
+    return run
+
+# ---------- main ----------
+
+def _sources(failed: set, guides: Optional[Dict[str, List[str]]] = None) -> List[Callable[[], Iterable[Document]]]:
+    # `failed` collects the (source, city) pairs a fetcher gave up on; `guides`
+    # the guide texts by city key, for the POI table
+    guides = {} if guides is None else guides
+    sources: List[Callable[[], Iterable[Document]]] = []
+    if ENABLE_LOCAL_FILES:
+        sources.append(_keep_guides(lambda: local_md_docs(DATA_DIR), guides))
+    if ENABLE_WIKIVOYAGE:
+        sources.append(_keep_guides(lambda: wikivoyage_docs(CITIES, failed), guides))
+    if ENABLE_WIKIPEDIA:
+        sources.append(lambda: wikipedia_docs(CITIES, failed))
+    if ENABLE_OVERPASS_OSM:
+        sources.append(lambda: overpass_poi_docs(CITIES, failed=failed))
     if ENABLE_URLS:
-        docs.extend(url_docs(URLS))
+        sources.append(lambda: url_docs(URLS))
+    return sources
+
+def _collection():
+    client = chromadb.PersistentClient(path=PERSIST_DIR)
+    return client.get_or_create_collection(COLLECTION)
+
+def _config() -> dict:
+    return {
+        "sources": [ENABLE_LOCAL_FILES, ENABLE_WIKIVOYAGE, ENABLE_WIKIPEDIA, ENABLE_OVERPASS_OSM, ENABLE_URLS],
+        "cities": CITIES, "urls": URLS, "model": EMBED_MODEL,
+        "chunk": [CHUNK_SIZE, CHUNK_OVERLAP], "collection": COLLECTION,
+    }
+
+def _last_run() -> dict:
+    try:
+        with open(LAST_RUN_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-    if not docs:
+def _indexing_progress(report: Callable[..., None]) -> Callable[[dict], None]:
+    # tqdm's counters -> chunks / throughput / ETA for the job status
+    def on_batch(fd: dict):
+        n, elapsed, total = fd["n"], fd["elapsed"], fd.get("total")
+        rate = fd.get("rate") or (n / elapsed if elapsed else None)
+        eta = (total - n) / rate if rate and total and total > n else None
+        report("indexing", chunks=n, expected_chunks=total, chunks_per_s=round(rate, 1) if rate else None,
+               eta_s=round(eta, 1) if eta is not None else None)
+    return on_batch
+
+def main(incremental: bool = INCREMENTAL, progress: Optional[Callable[..., None]] = None):
+    """`progress(stage, **info)` is called as the run moves through its stages."""
+    report = progress or (lambda stage, **info: None)
+    # 1) Sources stream documents as they are fetched
+    failed: set = set()
+    guides: Dict[str, List[str]] = {}
+    sources = _sources(failed, guides)
+    if not sources:
         print("No documents found. Enable at least one source or add files to data/guides/*.md")
-        return
+        return {"added": 0, "skipped": 0, "removed": 0}
+
+    # 2) fetch -> dedupe -> split -> embed -> upsert, all overlapping; chunk ids
+    #    are content hashes so re-runs are idempotent
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    checkpoint = pipeline.Checkpoint(CHECKPOINT_PATH, pipeline.fingerprint(dict(_config(), incremental=incremental)))
+    if checkpoint.done:
+        print(f"Resuming: {len(checkpoint.done)} docs already indexed by an interrupted run")
 
-    # 2) Deduplicate (cheap content hash)
-    docs = _dedupe(docs)
+    collection = _collection()
+    # the previous run's size is the best guess at this one's, for the ETA
+    expected = _last_run().get("chunks")
+    report("indexing", chunks=0, expected_chunks=expected)
+    # worker processes (INGEST_EMBED_WORKERS), normalised vectors like the query side
+    with embedding.EmbeddingEngine(model_name=EMBED_MODEL) as emb:
+        stats = pipeline.run(sources, splitter=splitter, collection=collection, embed=emb.embed_documents,
+                             doc_id=_doc_id, incremental=incremental, checkpoint=checkpoint, failed=failed,
+                             embed_batch=max(pipeline.EMBED_BATCH, emb.batch_hint),
+                             total=expected, progress=_indexing_progress(report))
+        stats["embedding"] = emb.stats()
+    e = stats["embedding"]
+    if e["chunks"]:
+        print(f"Embedded {e['chunks']} chunks in {e['seconds']} s: {e['chunks_per_s']} chunks/s "
+              f"({e['workers']} x {e['backend']}, {e['threads']} threads each; model load {e['load_s']} s)")
+    if not stats["docs"]:
+        print("No documents found. Enable at least one source or add files to data/guides/*.md")
 
-    # 3) Split
-    splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=120)
-    chunks = splitter.split_documents(docs)
+    # 3) BM25 index over the whole collection for hybrid retrieval
+    report("lexical")
+    stats["lexical_rows"] = lexical.build(collection, LEXICAL_DIR)
 
-    # 4) Embed + index (Chroma with HF embeddings)
-    emb = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2",
-                                encode_kwargs={"normalize_embeddings": True})
-    db = Chroma(collection_name="guides",
-                persist_directory=PERSIST_DIR,
-                embedding_function=emb)
+    # 3b) Read-only copy for serving; workers switch to it on their next search
+    if ENABLE_SNAPSHOT:
+        report("snapshot")
+        stats["snapshot"] = snapshot.export(collection, LEXICAL_DIR, dtype=SNAPSHOT_DTYPE, model=EMBED_MODEL)
 
-    # add in batches
-    BATCH = 200
-    for i in tqdm(range(0, len(chunks), BATCH), desc="Indexing"):
-        db.add_documents(chunks[i:i+BATCH])
+    # 4) Per-city POI table so the planner never calls out at request time
+    if ENABLE_POI_INDEX:
+        report("pois")
+        stats["pois"] = poi_index.build(CITIES, {
+            "guide": guide_pois(guides, collection),
+            "wikipedia": wikipedia_pois,
+            "osm": osm_pois,
+        })
 
-    print(f"Indexed {len(chunks)} chunks from {len(docs)} source docs into {PERSIST_DIR}")
+    os.makedirs(PERSIST_DIR, exist_ok=True)
+    with open(LAST_RUN_PATH, "w", encoding="utf-8") as f:
+        json.dump({"chunks": stats["added"] + stats["skipped"], "finished_at": time.time()}, f)
+    print(f"Indexed {stats['added'] + stats['skipped']} chunks from {stats['docs']} source docs into {PERSIST_DIR}: "
+          f"{stats['added']} added, {stats['skipped']} skipped, {stats['removed']} removed, "
+          f"{stats['resumed']} docs resumed")
+    return stats
 
 if __name__ == "__main__":
-    main()
+    main(incremental=INCREMENTAL and "--full" not in sys.argv[1:])
@@ -0,0 +1,124 @@
+# apps/api/rag/jobs.py
+"""Background ingest jobs.
+
+`submit` returns a Job right away; a single worker thread per collection runs
+that collection's jobs one after another, so two /ingest calls never write the
+same Chroma directory at once. A file lock next to the store extends that to
+other worker processes. Jobs report their stage and indexing progress
+(chunks, chunks/s, ETA) as they run; the most recent ones are kept for
+/ingest/{job_id}.
+"""
+from __future__ import annotations
+
+import os, threading, time, traceback, uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process serialisation only
+    fcntl = None
+
+KEEP_JOBS = int(os.getenv("INGEST_KEEP_JOBS", "100"))
+
+class Job:
+    def __init__(self, collection: str, params: Dict[str, Any]):
+        self.id = uuid.uuid4().hex[:12]
+        self.collection = collection
+        self.params = params
+        self.state = "queued"  # queued | running | succeeded | failed
+        self.stage: Optional[str] = None
+        self.progress: Dict[str, Any] = {}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def report(self, stage: str, **info):
+        self.stage = stage
+        if info:
+            self.progress = info
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id, "collection": self.collection, "params": self.params,
+            "state": self.state, "stage": self.stage, "progress": self.progress,
+            "result": self.result, "error": self.error,
+            "created_at": self.created_at, "started_at": self.started_at, "finished_at": self.finished_at,
+            "elapsed_s": round(end - self.started_at, 1) if self.started_at else None,
+        }
+
+@contextmanager
+def _store_lock(path: Optional[str]):
+    if not path or fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)  # waits for another process's run to finish
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+class JobQueue:
+    def __init__(self, keep: int = KEEP_JOBS):
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._workers: Dict[str, ThreadPoolExecutor] = {}
+
+    def submit(self, collection: str, fn: Callable[..., Dict[str, Any]], lock_path: Optional[str] = None,
+               **params) -> Job:
+        """Queue `fn(progress=job.report, **params)`. An identical job still waiting is reused."""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.collection == collection and job.state == "queued" and job.params == params:
+                    return job
+            job = Job(collection, params)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.keep:
+                oldest = next(iter(self._jobs.values()))
+                if oldest.state in ("queued", "running"):
+                    break
+                self._jobs.popitem(last=False)
+            pool = self._workers.get(collection)
+            if pool is None:
+                pool = self._workers[collection] = ThreadPoolExecutor(1, thread_name_prefix=f"ingest-{collection}")
+        pool.submit(self._run, job, fn, lock_path)
+        return job
+
+    def _run(self, job: Job, fn: Callable[..., Dict[str, Any]], lock_path: Optional[str]):
+        job.report("waiting for lock")
+        try:
+            with _store_lock(lock_path):
+                job.state, job.started_at = "running", time.time()
+                job.report("starting")
+                job.result = fn(progress=job.report, **job.params)
+            job.state = "succeeded"
+            job.report("done")
+        except Exception as e:
+            job.state, job.error = "failed", f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def shutdown(self):
+        with self._lock:
+            pools = list(self._workers.values())
+        for pool in pools:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+jobs = JobQueue()
@@ -0,0 +1,166 @@
+# apps/api/rag/lexical.py
+"""Compact BM25 index stored next to the Chroma store.
+
+Exact names ("Trevi Fountain", "Senso-ji") are rare tokens with high IDF, which
+is where lexical scoring beats MiniLM. Layout on disk (all arrays are flat and
+loaded with mmap, so opening the index costs a few page faults, not RAM):
+
+    meta.json          N, avgdl, BM25 params, city list
+    terms.npy          sorted fixed-width UTF-8 terms, looked up with searchsorted
+    term_off.npy       int64 start of each term's postings (+ one end offset)
+    ids.npy            fixed-width UTF-8 Chroma id per row
+    post_docs.npy      uint32 row numbers, grouped by term
+    post_tf.npy        uint16 term frequencies, parallel to post_docs
+    doc_len.npy        uint32 tokens per row
+    doc_city.npy       int32 index into meta["cities"] (-1 = none)
+"""
+from __future__ import annotations
+
+import json, os, re, shutil, unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+K1, B = 1.2, 0.75
+MAX_TERM_BYTES = 64  # longer "words" (URLs, hashes) would only widen every terms.npy entry
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text: str) -> List[str]:
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _TOKEN.findall(text.casefold())
+
+def build(collection, out_dir: str, page: int = 1000) -> int:
+    """Rebuild the index from every chunk in `collection`; returns the row count."""
+    ids: List[str] = []
+    doc_len: List[int] = []
+    doc_city: List[int] = []
+    cities: Dict[str, int] = {}
+    postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+    offset = 0
+    while True:
+        res = collection.get(include=["documents", "metadatas"], limit=page, offset=offset)
+        for cid, text, meta in zip(res["ids"], res["documents"], res["metadatas"]):
+            row = len(ids)
+            toks = tokenize(text or "")
+            ids.append(cid)
+            doc_len.append(len(toks))
+            city = (meta or {}).get("city")
+            doc_city.append(cities.setdefault(city, len(cities)) if city else -1)
+            for term, tf in Counter(toks).items():
+                postings[term].append((row, min(tf, 65535)))
+        if len(res["ids"]) < page:
+            break
+        offset += page
+
+    # code point order is UTF-8 byte order, so this is also the order searchsorted expects
+    terms = [t for t in sorted(postings) if len(t.encode("utf-8")) <= MAX_TERM_BYTES]
+    term_off = np.empty(len(terms) + 1, dtype=np.int64)
+    total = sum(len(postings[t]) for t in terms)
+    post_docs = np.empty(total, dtype=np.uint32)
+    post_tf = np.empty(total, dtype=np.uint16)
+    pos = 0
+    for i, term in enumerate(terms):
+        plist = postings[term]
+        term_off[i] = pos
+        post_docs[pos:pos + len(plist)] = [r for r, _ in plist]
+        post_tf[pos:pos + len(plist)] = [tf for _, tf in plist]
+        pos += len(plist)
+    term_off[len(terms)] = pos
+
+    # write next to the live index, then swap so readers never see a half-built one
+    tmp = out_dir + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    np.save(os.path.join(tmp, "post_docs.npy"), post_docs)
+    np.save(os.path.join(tmp, "post_tf.npy"), post_tf)
+    np.save(os.path.join(tmp, "doc_len.npy"), np.asarray(doc_len, dtype=np.uint32))
+    np.save(os.path.join(tmp, "doc_city.npy"), np.asarray(doc_city, dtype=np.int32))
+    np.save(os.path.join(tmp, "terms.npy"), np.array([t.encode("utf-8") for t in terms], dtype=bytes))
+    np.save(os.path.join(tmp, "term_off.npy"), term_off)
+    np.save(os.path.join(tmp, "ids.npy"), np.array([i.encode("utf-8") for i in ids], dtype=bytes))
+    meta = {"n": len(ids), "avgdl": (sum(doc_len) / len(ids)) if ids else 0.0, "k1": K1, "b": B,
+            "cities": sorted(cities, key=cities.get)}
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    old = out_dir + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(out_dir):
+        os.rename(out_dir, old)
+    os.rename(tmp, out_dir)
+    shutil.rmtree(old, ignore_errors=True)
+    return len(ids)
+
+class LexicalIndex:
+    def __init__(self, path: str):
+        self.path = path
+        self.mtime = os.stat(os.path.join(path, "meta.json")).st_mtime
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+        self.terms = load("terms.npy")
+        self.term_off = load("term_off.npy")
+        self.ids = load("ids.npy")
+        self.post_docs = load("post_docs.npy")
+        self.post_tf = load("post_tf.npy")
+        self.doc_len = load("doc_len.npy")
+        self.doc_city = load("doc_city.npy")
+        self.cities = {c: i for i, c in enumerate(self.meta["cities"])}
+
+    @classmethod
+    def open(cls, path: str) -> Optional["LexicalIndex"]:
+        # an index from before terms.npy needs a re-ingest; until then search is vector-only
+        ok = all(os.path.exists(os.path.join(path, name)) for name in ("meta.json", "terms.npy"))
+        return cls(path) if ok else None
+
+    def stale(self) -> bool:
+        try:
+            return os.stat(os.path.join(self.path, "meta.json")).st_mtime != self.mtime
+        except FileNotFoundError:
+            return True
+
+    def has_city(self, city: str) -> bool:
+        return city in self.cities
+
+    def search(self, query: str, k: int = 10, city: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Top-k (chroma_id, bm25 score), optionally restricted to one city."""
+        n = self.meta["n"]
+        if not n:
+            return []
+        k1, b, avgdl = self.meta["k1"], self.meta["b"], self.meta["avgdl"] or 1.0
+        ci = None
+        if city is not None:
+            ci = self.cities.get(city)
+            if ci is None:
+                return []
+        width = self.terms.dtype.itemsize
+        rows, contrib = [], []
+        for term in set(tokenize(query)):
+            key = term.encode("utf-8")
+            if len(key) > width:
+                continue
+            t = int(np.searchsorted(self.terms, key))
+            if t >= len(self.terms) or self.terms[t] != key:
+                continue
+            off, end = int(self.term_off[t]), int(self.term_off[t + 1])
+            df = end - off
+            docs = np.asarray(self.post_docs[off:end])
+            tf = self.post_tf[off:end].astype(np.float32)
+            if ci is not None:
+                keep = self.doc_city[docs] == ci
+                docs, tf = docs[keep], tf[keep]
+            idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+            norm = k1 * (1 - b + b * self.doc_len[docs] / avgdl)
+            rows.append(docs)
+            contrib.append(idf * tf * (k1 + 1) / (tf + norm))
+        if not rows:
+            return []
+        # only rows some query term touched are scored
+        cand, inv = np.unique(np.concatenate(rows), return_inverse=True)
+        scores = np.bincount(inv, weights=np.concatenate(contrib), minlength=len(cand))
+        nz = np.flatnonzero(scores > 0)
+        if not len(nz):
+            return []
+        top = nz[np.argsort(-scores[nz], kind="stable")[:k]]
+        return [(self.ids[cand[i]].decode("utf-8"), float(scores[i])) for i in top]
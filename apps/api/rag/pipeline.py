@@ -0,0 +1,260 @@
+# apps/api/rag/pipeline.py
+"""Streaming ingest pipeline: fetch -> dedupe/split -> embed -> upsert.
+
+Each stage runs on its own thread and hands work to the next through a bounded
+queue, so embedding starts as soon as the first document arrives and peak
+memory is set by the queue sizes rather than the corpus size. Completed source
+documents are appended to a checkpoint file; after a crash the next run skips
+them instead of re-embedding from zero.
+"""
+from __future__ import annotations
+
+import hashlib, json, os, queue, threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from langchain_core.documents import Document
+from tqdm import tqdm
+
+QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "256"))      # items per inter-stage queue
+EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "128"))    # MiniLM on CPU saturates around here
+
+_DONE = object()
+
+class _Stop(Exception):
+    pass
+
+class Checkpoint:
+    """Append-only list of fully indexed doc ids, tied to a config fingerprint."""
+
+    def __init__(self, path: str, fingerprint: str):
+        self.path = path
+        self.done: set = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+            if lines and lines[0] == fingerprint:
+                self.done = set(lines[1:])
+        if not self.done:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(fingerprint + "\n")
+        self._f = open(path, "a", encoding="utf-8")
+
+    def add(self, doc_ids: List[str]):
+        if doc_ids:
+            self._f.write("".join(f"{d}\n" for d in doc_ids))
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self.done.update(doc_ids)
+
+    def finish(self):
+        # a clean run leaves nothing to resume
+        self._f.close()
+        os.remove(self.path)
+
+    def close(self):
+        self._f.close()
+
+def fingerprint(config: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+class _Runner:
+    def __init__(self):
+        self.stop = threading.Event()
+        self.errors: List[BaseException] = []
+        self.threads: List[threading.Thread] = []
+
+    def put(self, q: queue.Queue, item):
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.2)
+                return
+            except queue.Full:
+                continue
+        raise _Stop()
+
+    def drain(self, q: queue.Queue, producers: int = 1) -> Iterator[Any]:
+        left = producers
+        while left:
+            try:
+                item = q.get(timeout=0.2)
+            except queue.Empty:
+                if self.stop.is_set():
+                    raise _Stop()
+                continue
+            if item is _DONE:
+                left -= 1
+            else:
+                yield item
+
+    def spawn(self, name: str, items: Callable[[], Iterable[Any]], out: queue.Queue):
+        def run():
+            try:
+                for item in items():
+                    self.put(out, item)
+            except _Stop:
+                pass
+            except BaseException as e:
+                self.errors.append(e)
+                self.stop.set()
+            finally:
+                try:
+                    self.put(out, _DONE)
+                except _Stop:
+                    pass
+        t = threading.Thread(target=run, name=f"ingest-{name}", daemon=True)
+        t.start()
+        self.threads.append(t)
+
+def _split(docs: Iterable[Document], splitter, doc_id: Callable[[str, dict], str],
+           seen_docs: set, resumed: set) -> Iterator[tuple]:
+    # yields (doc_id, chunk_id, chunk, is_last_chunk_of_doc)
+    for d in docs:
+        did = doc_id(d.page_content, d.metadata or {})
+        if did in seen_docs:
+            continue
+        seen_docs.add(did)
+        if did in resumed:
+            continue
+        d.metadata["doc_id"] = did
+        chunks, seen_chunks = [], set()
+        for c in splitter.split_documents([d]):
+            cid = doc_id(c.page_content, c.metadata or {})
+            if cid not in seen_chunks:
+                seen_chunks.add(cid)
+                chunks.append((cid, c))
+        for i, (cid, c) in enumerate(chunks):
+            yield did, cid, c, i == len(chunks) - 1
+
+def _batches(items: Iterable[tuple], size: int) -> Iterator[List[tuple]]:
+    batch: List[tuple] = []
+    for it in items:
+        batch.append(it)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _embed(batches: Iterable[List[tuple]], collection, embed: Callable[[List[str]], List[List[float]]],
+           incremental: bool) -> Iterator[tuple]:
+    # yields (batch, indices_to_upsert, embeddings, indices_to_relink)
+    for batch in batches:
+        ids = [cid for _, cid, _, _ in batch]
+        # the same chunk text can come from two docs of one source; Chroma rejects
+        # repeated ids in a call, so only the first copy is written
+        first: Dict[str, int] = {}
+        for i, cid in enumerate(ids):
+            first.setdefault(cid, i)
+        existing: Dict[str, Any] = {}
+        if incremental:
+            res = collection.get(ids=list(first), include=["metadatas"])
+            existing = {cid: meta or {} for cid, meta in zip(res["ids"], res["metadatas"])}
+        todo = [i for cid, i in first.items() if cid not in existing]
+        # unchanged text but new metadata (edited parent doc, new fields): keep the
+        # vector and only rewrite the metadata
+        relink = [i for cid, i in first.items() if cid in existing and existing[cid] != batch[i][2].metadata]
+        vectors = embed([batch[i][2].page_content for i in todo]) if todo else []
+        yield batch, todo, vectors, relink
+
+def stale_ids(collection, sources: List[str], current_docs: set, failed: Iterable[tuple] = (),
+              page: int = 1000) -> List[str]:
+    """Chunks of `sources` whose parent document wasn't seen in this run, except
+    those of (source, city) pairs whose fetch failed."""
+    failed = set(failed)
+    stale: List[str] = []
+    if not sources:
+        return stale
+    offset = 0
+    while True:
+        res = collection.get(where={"source": {"$in": sources}}, include=["metadatas"],
+                             limit=page, offset=offset)
+        for cid, meta in zip(res["ids"], res["metadatas"]):
+            meta = meta or {}
+            if meta.get("doc_id") not in current_docs and (meta.get("source"), meta.get("city")) not in failed:
+                stale.append(cid)
+        if len(res["ids"]) < page:
+            return stale
+        offset += page
+
+def run(sources: List[Callable[[], Iterable[Document]]], *, splitter, collection,
+        embed: Callable[[List[str]], List[List[float]]], doc_id: Callable[[str, dict], str],
+        incremental: bool = True, checkpoint: Optional[Checkpoint] = None, failed: Optional[set] = None,
+        queue_size: int = QUEUE_SIZE, embed_batch: int = EMBED_BATCH,
+        total: Optional[int] = None, progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, int]:
+    """Stream `sources` into `collection`; returns added/skipped/removed/resumed counts.
+
+    `total` is an expected chunk count (for the ETA); `progress` gets the tqdm
+    bar's `format_dict` after every batch. Sources add the (source, city) pairs
+    they couldn't fetch to `failed`, so their chunks survive reconciliation.
+    """
+    r = _Runner()
+    resumed = set(checkpoint.done) if checkpoint else set()
+    seen_docs: set = set()
+    sources_seen: set = set()
+
+    def tag(docs: Iterable[Document]) -> Iterator[Document]:
+        for d in docs:
+            src = (d.metadata or {}).get("source")
+            if src:
+                sources_seen.add(src)
+            yield d
+
+    fetched: queue.Queue = queue.Queue(queue_size)
+    for i, src in enumerate(sources):
+        r.spawn(f"fetch-{i}", lambda src=src: tag(src()), fetched)
+
+    chunks: queue.Queue = queue.Queue(queue_size)
+    r.spawn("split", lambda: _split(r.drain(fetched, len(sources)), splitter, doc_id, seen_docs, resumed), chunks)
+
+    # each item is a whole batch, so keep only a couple in flight
+    embedded: queue.Queue = queue.Queue(2)
+    r.spawn("embed", lambda: _embed(_batches(r.drain(chunks), embed_batch), collection, embed, incremental), embedded)
+
+    stats = {"added": 0, "skipped": 0, "removed": 0, "resumed": 0}
+    bar = tqdm(desc="Indexing", unit="chunk", total=total)
+    try:
+        for batch, todo, vectors, relink in r.drain(embedded):
+            if todo:
+                collection.upsert(
+                    ids=[batch[i][1] for i in todo],
+                    embeddings=[list(v) for v in vectors],
+                    documents=[batch[i][2].page_content for i in todo],
+                    metadatas=[batch[i][2].metadata for i in todo],
+                )
+            if relink:
+                collection.update(ids=[batch[i][1] for i in relink],
+                                  metadatas=[batch[i][2].metadata for i in relink])
+            if checkpoint:
+                checkpoint.add([did for did, _, _, last in batch if last])
+            stats["added"] += len(todo)
+            stats["skipped"] += len(batch) - len(todo)
+            bar.update(len(batch))
+            if progress:
+                progress(bar.format_dict)
+    except _Stop:
+        pass
+    except BaseException:
+        r.stop.set()
+        raise
+    finally:
+        bar.close()
+        for t in r.threads:
+            t.join()
+        if checkpoint and (r.errors or r.stop.is_set()):
+            checkpoint.close()
+    if r.errors:
+        raise r.errors[0]
+
+    stats["resumed"] = len(resumed & seen_docs)
+    if incremental:
+        # only reconcile sources that returned something, and within them skip the
+        # cities whose fetch failed, so an outage (total or partial) doesn't wipe them
+        stale = stale_ids(collection, sorted(sources_seen), seen_docs, failed or ())
+        for i in range(0, len(stale), 500):
+            collection.delete(ids=stale[i:i+500])
+        stats["removed"] = len(stale)
+    stats["docs"] = len(seen_docs)
+    if checkpoint:
+        checkpoint.finish()
+    return stats
@@ -0,0 +1,89 @@
+# apps/api/rag/poi_index.py
+"""Per-city POI table built at ingest time.
+
+One SQLite file keyed on (city, rank), so the planner gets a city's POIs,
+already in rank order, with a single indexed range scan and no network calls. Entries carry
+name, coordinates (when known), category and source.
+"""
+from __future__ import annotations
+
+import logging, os, sqlite3
+from typing import Callable, Dict, Iterable, List, Optional
+
+from . import fetch
+from .retriever import PERSIST_DIR, city_key
+
+log = logging.getLogger(__name__)
+
+DB_PATH = os.path.join(PERSIST_DIR, "pois.sqlite3")
+
+# lower ranks first: curated guides, then Wikipedia articles, then raw OSM tags
+SOURCE_PRIORITY = {"guide": 0, "wikipedia": 1, "osm": 2}
+
+Poi = Dict[str, object]  # {"name", "lat", "lon", "category", "source"}
+
+def _merge(per_source: Dict[str, List[Poi]]) -> List[Poi]:
+    merged: Dict[str, Poi] = {}
+    for source in sorted(per_source, key=lambda s: SOURCE_PRIORITY.get(s, 99)):
+        for p in per_source[source]:
+            key = " ".join(str(p["name"]).split()).casefold()
+            if not key:
+                continue
+            cur = merged.get(key)
+            if cur is None:
+                merged[key] = dict(p, source=source)
+            elif cur.get("lat") is None and p.get("lat") is not None:
+                # keep the better-ranked entry but borrow coordinates and the specific category
+                cur["lat"], cur["lon"] = p["lat"], p["lon"]
+                if cur.get("category") == "guide":
+                    cur["category"] = p.get("category")
+    return list(merged.values())
+
+def build(cities: Iterable[str], sources: Dict[str, Callable[[str], List[Poi]]], path: str = DB_PATH) -> int:
+    """Fetch every source for every city (concurrently) and atomically replace the table."""
+    def one(city: str):
+        per_source = {}
+        for name, fn in sources.items():
+            try:
+                per_source[name] = fn(city) or []
+            except Exception as e:
+                log.warning("POI source %s failed for %s: %s: %s", name, city, type(e).__name__, e)
+        return city, _merge(per_source)
+
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    db = sqlite3.connect(tmp)
+    db.execute(
+        "CREATE TABLE pois ("
+        " city TEXT NOT NULL, name TEXT NOT NULL, lat REAL, lon REAL, category TEXT, source TEXT,"
+        " rank INTEGER NOT NULL, PRIMARY KEY (city, rank)) WITHOUT ROWID"
+    )
+    rows = 0
+    for city, pois in fetch.run(one, list(cities)):
+        db.executemany(
+            "INSERT OR REPLACE INTO pois VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(city_key(city), p["name"], p.get("lat"), p.get("lon"), p.get("category"), p["source"], i)
+             for i, p in enumerate(pois)],
+        )
+        rows += len(pois)
+    db.commit()
+    db.close()
+    os.replace(tmp, path)
+    return rows
+
+def lookup(city: str, limit: int = 40, path: Optional[str] = None) -> List[Poi]:
+    """A city's POIs in rank order; [] if the table or city is missing."""
+    path = path or DB_PATH
+    if not os.path.exists(path):
+        return []
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        cur = db.execute(
+            "SELECT name, lat, lon, category, source FROM pois WHERE city = ? ORDER BY rank LIMIT ?",
+            (city_key(city), limit),
+        )
+        return [{"name": n, "lat": la, "lon": lo, "category": c, "source": s} for n, la, lo, c, s in cur]
+    finally:
+        db.close()
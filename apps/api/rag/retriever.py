@@ -1,19 +1,180 @@
-from typing import List, Dict, Any
-from langchain_community.vectorstores import Chroma
-from sentence_transformers import SentenceTransformer
+import os, threading, time, unicodedata
+from typing import List, Dict, Any, Optional, Tuple
+
+import requests
+
+from .encoder import BatchingEncoder
+from .lexical import LexicalIndex
 
 PERSIST_DIR = "vectorstore"
+COLLECTION = "guides"
+LEXICAL_DIR = os.path.join(PERSIST_DIR, "lexical")  # BM25 index written by ingest
+# "hybrid" fuses vector and BM25 rankings (reciprocal rank fusion); "vector" is embeddings only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+RRF_K = 60
+EMBED_MODEL = "all-MiniLM-L6-v2"
+# Point workers at an embedding sidecar (`uvicorn apps.api.rag.embed_server:app --port 8100`)
+# so one loaded model serves all of them instead of one copy per worker.
+EMBEDDER_URL = os.getenv("EMBEDDER_URL", "")
+# "chroma" queries the live collection; "snapshot" the read-only mmap export ingest publishes;
+# "auto" uses the snapshot when there is one
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "auto")
+
+def city_key(name: str) -> str:
+    """Normalised `city` metadata value shared by ingest and search ("São Paulo" -> "sao paulo")."""
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(ch for ch in name if not unicodedata.combining(ch))
+    return " ".join(name.split()).casefold()
+
+class RemoteEmbedder:
+    """SentenceTransformer-compatible `encode` backed by the embedding sidecar."""
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def encode(self, sentences, **_):
+        single = isinstance(sentences, str)
+        r = self._session.post(f"{self.url}/embed", json={"texts": [sentences] if single else list(sentences)},
+                               timeout=self.timeout)
+        r.raise_for_status()
+        vectors = r.json()["vectors"]
+        return vectors[0] if single else vectors
+
+def load_embedder():
+    if EMBEDDER_URL:
+        return RemoteEmbedder(EMBEDDER_URL)
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBED_MODEL)
+
+Hit = Tuple[str, str, Dict[str, Any]]  # (chroma id, text, metadata)
+
+def query_text(city: str, interests: List[str]) -> str:
+    # sorted so the same interests hit the same cache entry whatever their order
+    return f"{city} travel guide tips " + " ".join(sorted(interests or []))
+
+class ChromaStore:
+    """Vector search straight on the Chroma collection (the directory ingest writes to)."""
+
+    def __init__(self):
+        import chromadb
+        self.collection = chromadb.PersistentClient(path=PERSIST_DIR).get_or_create_collection(COLLECTION)
+        self.lexical = LexicalIndex.open(LEXICAL_DIR)  # mmap'd, so cheap to open
+
+    def query(self, vec, k: int, city: Optional[str] = None) -> List[Hit]:
+        res = self.collection.query(query_embeddings=[[float(x) for x in vec]], n_results=k,
+                                    where={"city": city} if city else None, include=["documents", "metadatas"])
+        return list(zip(res["ids"][0], res["documents"][0], res["metadatas"][0]))
+
+    def get(self, ids: List[str]) -> List[Hit]:
+        res = self.collection.get(ids=ids, include=["documents", "metadatas"])
+        return list(zip(res["ids"], res["documents"], res["metadatas"]))
+
+    def lexical_index(self) -> Optional[LexicalIndex]:
+        # pick up a rebuilt index after /ingest without restarting
+        if self.lexical is None or self.lexical.stale():
+            self.lexical = LexicalIndex.open(LEXICAL_DIR)
+        return self.lexical
 
 class Retriever:
     def __init__(self):
-        self.db = Chroma(collection_name="guides", persist_directory=PERSIST_DIR)
-        self.embedder = SentenceTransformer("all-MiniLM-L6-v2")
+        # "auto" serves the published snapshot (rag/snapshot.py) once ingest has made one
+        # and opens Chroma only until then
+        self.snapshots = None
+        self._chroma: Optional[ChromaStore] = None
+        self._chroma_lock = threading.Lock()
+        if VECTOR_BACKEND in ("snapshot", "auto"):
+            from .snapshot import Published
+            self.snapshots = Published()
+            if VECTOR_BACKEND == "snapshot" and self.snapshots.snapshot is None:
+                raise FileNotFoundError("No published vector snapshot. Run ingest first.")
+        elif VECTOR_BACKEND != "chroma":
+            raise ValueError(f"Unknown VECTOR_BACKEND: {VECTOR_BACKEND}")
+        if self.snapshots is None or self.snapshots.snapshot is None:
+            self._chroma_store()
+        self.embedder = load_embedder()
+        self.embedder.encode("warm up")  # first call allocates/initialises the model
+        self.encoder = BatchingEncoder(self.embedder)  # cached + micro-batched query vectors
+
+    def _chroma_store(self) -> ChromaStore:
+        if self._chroma is None:
+            with self._chroma_lock:
+                if self._chroma is None:
+                    self._chroma = ChromaStore()
+        return self._chroma
+
+    def store(self):
+        """Snapshot or Chroma store; a search holds on to one, so a swap can't land mid-query."""
+        snap = self.snapshots.current() if self.snapshots is not None else None
+        return snap if snap is not None else self._chroma_store()
+
+    def _fuse(self, store, vector_hits: List[Hit], lexical_ids: List[str], k: int) -> List[Hit]:
+        scores: Dict[str, float] = {}
+        for ranking in ([h[0] for h in vector_hits], lexical_ids):
+            for rank, cid in enumerate(ranking):
+                scores[cid] = scores.get(cid, 0.0) + 1.0 / (RRF_K + rank + 1)
+        top = sorted(scores, key=scores.get, reverse=True)[:k]
+        known = {h[0]: h for h in vector_hits}
+        missing = [cid for cid in top if cid not in known]
+        if missing:
+            known.update({h[0]: h for h in store.get(missing)})
+        return [known[cid] for cid in top if cid in known]
+
+    def search(self, city: str, interests: List[str], k: int = 8, mode: Optional[str] = None) -> List[Dict[str, Any]]:
+        mode = mode or RETRIEVAL_MODE
+        query = query_text(city, interests)
+        vec = self.encoder.encode(query)
+        depth = k * 2 if mode == "hybrid" else k
+        # the city filter is pushed down so only that city's chunks are scored
+        key = city_key(city)
+        store = self.store()
+        hits = store.query(vec, depth, key)
+        scoped = bool(hits)
+        if not hits:
+            # city not ingested (or an index built before the city field existed)
+            hits = store.query(vec, depth, None)
+        lexical = store.lexical_index() if mode == "hybrid" else None
+        if lexical is not None:
+            lex = lexical.search(query, k=depth, city=key if scoped else None)
+            hits = self._fuse(store, hits, [cid for cid, _ in lex], k)
+        return [{"content": doc, "metadata": meta or {}} for _, doc, meta in hits[:k]]
+
+# Built on first use (or by warm_up from the app lifespan) rather than at import,
+# so importing the graph doesn't load the model.
+_lock = threading.Lock()
+_retriever: Optional[Retriever] = None
+_status: Dict[str, Any] = {"state": "cold", "load_s": None, "error": None}
+
+def get_retriever() -> Retriever:
+    global _retriever
+    if _retriever is None:
+        with _lock:
+            if _retriever is None:
+                _status.update(state="loading", error=None)
+                t0 = time.perf_counter()
+                try:
+                    _retriever = Retriever()
+                except Exception as e:
+                    _status.update(state="failed", error=f"{type(e).__name__}: {e}")
+                    raise
+                _status.update(state="ready", load_s=round(time.perf_counter() - t0, 2))
+    return _retriever
+
+def warm_up(budget_s: float) -> bool:
+    """Load in the background; wait up to `budget_s` seconds. Returns readiness."""
+    def load():
+        try:
+            get_retriever()
+        except Exception:
+            pass  # recorded in status()
+    t = threading.Thread(target=load, name="retriever-warmup", daemon=True)
+    t.start()
+    t.join(timeout=budget_s)
+    return is_ready()
 
-    def search(self, city: str, interests: List[str], k: int = 8) -> List[Dict[str, Any]]:
-        query = f"{city} travel guide tips " + " ".join(interests or [])
-        vec = self.embedder.encode(query)
-        # Chroma API: similarity_search_by_vector
-        docs = self.db.similarity_search_by_vector(vec, k=k)
-        return [{"content": d.page_content, "metadata": d.metadata} for d in docs]
+def is_ready() -> bool:
+    return _retriever is not None
 
-retriever = Retriever()
+def status() -> Dict[str, Any]:
+    return dict(_status)
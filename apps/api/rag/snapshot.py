@@ -0,0 +1,226 @@
+# apps/api/rag/snapshot.py
+"""Immutable, memory-mapped serving snapshot of the vector store.
+
+Ingest ends by exporting the collection into a fresh directory under
+vectorstore/snapshots/ and pointing vectorstore/snapshots/CURRENT at it
+(write + rename, so the switch is atomic). Serving workers mmap the arrays,
+so every worker on a box shares one page-cache copy, and none of them open
+the Chroma directory /ingest writes to. Rows are grouped by city, so the
+city-filtered search the planner makes is an exact dot product over one
+contiguous slice (vectors are normalised, so it ranks like Chroma's L2).
+
+    manifest.json   rows, dim, dtype, model, created_at (written last)
+    vectors.npy     (rows, dim) float16, or int8 with per-row scales.npy
+    spans.npy       (rows, 2) int64 byte range of each row in rows.bin
+    rows.bin        one JSON object per row: id, document, metadata
+    ids.npy         Chroma ids, sorted; id_rows.npy maps them back to rows
+    cities.json     city -> [first row, end row)
+    lexical/        copy of the BM25 index built from the same collection
+"""
+from __future__ import annotations
+
+import json, mmap, os, shutil, threading, time
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from .lexical import LexicalIndex
+from .retriever import LEXICAL_DIR, PERSIST_DIR, Hit
+
+SNAPSHOT_ROOT = os.path.join(PERSIST_DIR, "snapshots")
+CURRENT = "CURRENT"
+KEEP = 2  # published snapshots left on disk; workers still mapping a deleted one keep its pages
+RELOAD_CHECK_S = float(os.getenv("SNAPSHOT_RELOAD_CHECK_S", "2"))
+BLOCK = 8192  # rows scored per matmul, bounds the float32 temporaries
+
+def _pages(collection, include: List[str], page: int) -> Iterator[dict]:
+    offset = 0
+    while True:
+        res = collection.get(include=include, limit=page, offset=offset)
+        yield res
+        if len(res["ids"]) < page:
+            return
+        offset += page
+
+def export(collection, lexical_dir: Optional[str] = LEXICAL_DIR, root: str = SNAPSHOT_ROOT,
+           dtype: str = "float16", model: Optional[str] = None, page: int = 1000) -> Optional[Dict[str, Any]]:
+    """Write and publish a snapshot of `collection`; returns its manifest (None if empty)."""
+    if dtype not in ("float16", "int8"):
+        raise ValueError(f"Unknown snapshot dtype: {dtype}")
+    # pass 1: how many rows each city has, so pass 2 can write every row in place
+    counts: Dict[str, int] = {}
+    for res in _pages(collection, ["metadatas"], page):
+        for meta in res["metadatas"]:
+            city = (meta or {}).get("city") or ""
+            counts[city] = counts.get(city, 0) + 1
+    n = sum(counts.values())
+    if not n:
+        return None
+    ranges: Dict[str, List[int]] = {}
+    start = 0
+    for city in sorted(counts):
+        ranges[city] = [start, start + counts[city]]
+        start += counts[city]
+    fill = {city: r[0] for city, r in ranges.items()}
+
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    tmp = os.path.join(root, f".{name}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    vectors = None
+    scales = np.ones(n, dtype=np.float32)
+    spans = np.empty((n, 2), dtype=np.int64)
+    ids: List[str] = [""] * n
+    with open(os.path.join(tmp, "rows.bin"), "wb") as rows:
+        for res in _pages(collection, ["embeddings", "documents", "metadatas"], page):
+            emb = np.asarray(res["embeddings"], dtype=np.float32)
+            if vectors is None and len(emb):
+                vectors = np.lib.format.open_memmap(os.path.join(tmp, "vectors.npy"), mode="w+",
+                                                    dtype=np.float16 if dtype == "float16" else np.int8,
+                                                    shape=(n, emb.shape[1]))
+            for j, (cid, doc, meta) in enumerate(zip(res["ids"], res["documents"], res["metadatas"])):
+                city = (meta or {}).get("city") or ""
+                if city not in fill or fill[city] >= ranges[city][1]:
+                    raise RuntimeError("collection changed during snapshot export")
+                row = fill[city]
+                fill[city] += 1
+                if dtype == "int8":
+                    scales[row] = max(float(np.abs(emb[j]).max()) / 127.0, 1e-12)
+                    vectors[row] = np.round(emb[j] / scales[row]).astype(np.int8)
+                else:
+                    vectors[row] = emb[j]
+                payload = json.dumps({"id": cid, "document": doc, "metadata": meta or {}},
+                                     ensure_ascii=False).encode("utf-8")
+                spans[row] = (rows.tell(), rows.tell() + len(payload))
+                rows.write(payload)
+                ids[row] = cid
+    if any(fill[city] != r[1] for city, r in ranges.items()):
+        raise RuntimeError("collection changed during snapshot export")
+    dim = vectors.shape[1]
+    vectors.flush()
+    del vectors
+    if dtype == "int8":
+        np.save(os.path.join(tmp, "scales.npy"), scales)
+    np.save(os.path.join(tmp, "spans.npy"), spans)
+    id_arr = np.array([i.encode("utf-8") for i in ids])
+    order = np.argsort(id_arr, kind="stable")
+    np.save(os.path.join(tmp, "ids.npy"), id_arr[order])
+    np.save(os.path.join(tmp, "id_rows.npy"), order.astype(np.int64))
+    with open(os.path.join(tmp, "cities.json"), "w", encoding="utf-8") as f:
+        json.dump(ranges, f)
+    if lexical_dir and os.path.exists(os.path.join(lexical_dir, "meta.json")):
+        shutil.copytree(lexical_dir, os.path.join(tmp, "lexical"))
+    manifest = {"name": name, "rows": n, "dim": dim, "dtype": dtype, "model": model, "created_at": time.time()}
+    with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.rename(tmp, os.path.join(root, name))
+    publish(name, root)
+    prune(root)
+    return manifest
+
+def publish(name: str, root: str = SNAPSHOT_ROOT):
+    """Make `name` the snapshot workers serve; they pick it up within RELOAD_CHECK_S."""
+    tmp = os.path.join(root, f"{CURRENT}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(root, CURRENT))
+
+def current(root: str = SNAPSHOT_ROOT) -> Optional[str]:
+    try:
+        with open(os.path.join(root, CURRENT), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def prune(root: str = SNAPSHOT_ROOT, keep: int = KEEP):
+    live = current(root)
+    names = sorted(d for d in os.listdir(root) if not d.startswith(".") and os.path.isdir(os.path.join(root, d)))
+    for name in names[:-keep] if keep else names:
+        if name != live:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+class Snapshot:
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        with open(os.path.join(path, "cities.json"), "r", encoding="utf-8") as f:
+            self.cities: Dict[str, List[int]] = json.load(f)
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+        self.vectors = load("vectors.npy")
+        self.scales = load("scales.npy") if self.manifest["dtype"] == "int8" else None
+        self.spans = load("spans.npy")
+        self.ids = load("ids.npy")
+        self.id_rows = load("id_rows.npy")
+        with open(os.path.join(path, "rows.bin"), "rb") as f:
+            self._rows = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.lexical = LexicalIndex.open(os.path.join(path, "lexical"))
+
+    def row(self, i: int) -> Hit:
+        start, end = self.spans[i]
+        js = json.loads(self._rows[start:end])
+        return js["id"], js["document"], js["metadata"]
+
+    def _scores(self, lo: int, hi: int, q: np.ndarray) -> np.ndarray:
+        out = np.empty(hi - lo, dtype=np.float32)
+        for b in range(lo, hi, BLOCK):
+            e = min(b + BLOCK, hi)
+            s = self.vectors[b:e].astype(np.float32) @ q
+            out[b - lo:e - lo] = s * self.scales[b:e] if self.scales is not None else s
+        return out
+
+    def query(self, vec, k: int, city: Optional[str] = None) -> List[Hit]:
+        """Top-k rows by dot product, optionally within one city."""
+        lo, hi = (0, self.manifest["rows"]) if city is None else self.cities.get(city, (0, 0))
+        if hi <= lo or k <= 0:
+            return []
+        scores = self._scores(lo, hi, np.asarray(vec, dtype=np.float32).ravel())
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [self.row(lo + int(i)) for i in top]
+
+    def get(self, ids: List[str]) -> List[Hit]:
+        width = self.ids.dtype.itemsize
+        keys = [i.encode("utf-8") for i in ids]
+        keys = [key for key in keys if len(key) <= width]  # longer can't be in the table
+        if not keys:
+            return []
+        pos = np.searchsorted(self.ids, np.array(keys, dtype=self.ids.dtype))
+        return [self.row(int(self.id_rows[p])) for key, p in zip(keys, pos)
+                if p < len(self.ids) and self.ids[p] == key]
+
+    def lexical_index(self) -> Optional[LexicalIndex]:
+        return self.lexical
+
+class Published:
+    """Whatever CURRENT names, re-checked at most every `check_s`. A new snapshot is
+    opened and swapped in; searches already running finish on the one they started with."""
+
+    def __init__(self, root: str = SNAPSHOT_ROOT, check_s: float = RELOAD_CHECK_S):
+        self.root, self.check_s = root, check_s
+        self._lock = threading.Lock()
+        self._checked = 0.0
+        self.name: Optional[str] = None
+        self.snapshot: Optional[Snapshot] = None
+        self._refresh()
+        self._checked = time.monotonic()
+
+    def _refresh(self):
+        name = current(self.root)
+        if name and name != self.name:
+            try:
+                self.snapshot, self.name = Snapshot(os.path.join(self.root, name)), name
+            except OSError as e:
+                # pruned by a newer publish before we got to it; the next check sees that one
+                print("Error:", type(e).__name__, "-", e)
+
+    def current(self) -> Optional[Snapshot]:
+        now = time.monotonic()
+        if now - self._checked >= self.check_s:
+            with self._lock:
+                if now - self._checked >= self.check_s:
+                    self._checked = now
+                    self._refresh()
+        return self.snapshot
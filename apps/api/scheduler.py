@@ -0,0 +1,168 @@
+# apps/api/scheduler.py
+"""Route-aware day assignment for the rule-based itinerary.
+
+POIs with coordinates are grouped into compact days (highest-ranked free POI
+seeds a day, its nearest free neighbours fill it, found through a uniform grid
+index), days with the most indoor stops go to the rainiest dates, and each
+day is ordered with nearest neighbour + 2-opt. POIs with coordinates take the
+slots first, whatever their rank relative to POIs without; those only fill
+slots left over, at the end of a day. A few hundred candidates take a few
+milliseconds.
+"""
+from __future__ import annotations
+
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .models.itinerary import Poi
+
+# max stops per day by pace
+PACE_STOPS = {"relaxed": 4, "packed": 6}
+# geo candidates considered per geo slot: >1 lets a day swap a far-off POI for a
+# slightly lower-ranked one next door; 1 only re-partitions the top-ranked POIs
+POOL_FACTOR = 2
+INDOOR_CATEGORIES = {"museum", "gallery", "aquarium", "planetarium", "theatre", "cinema",
+                     "library", "church", "cathedral", "palace"}
+INDOOR_WORDS = ("museum", "museo", "gallery", "galleria", "basilica", "cathedral", "church", "palace", "palazzo")
+
+def per_day(n_pois: int, days: int, pace: str = "relaxed") -> int:
+    cap = PACE_STOPS.get(pace, PACE_STOPS["relaxed"])
+    return max(3, min(cap, math.ceil(n_pois / max(days, 1)))) if n_pois else cap
+
+def is_indoor(p: Poi) -> bool:
+    if p.category and p.category.casefold() in INDOOR_CATEGORIES:
+        return True
+    name = p.name.casefold()
+    return any(w in name for w in INDOOR_WORDS)
+
+def _project(pois: List[Poi]) -> List[Tuple[float, float]]:
+    # equirectangular km around the mean latitude; plenty for one city
+    lat0 = math.radians(sum(p.lat for p in pois) / len(pois))
+    kx, ky = 111.32 * math.cos(lat0), 110.57
+    return [(p.lon * kx, p.lat * ky) for p in pois]
+
+class _Grid:
+    """Points bucketed on a square grid; nearest-free queries scan rings of cells outward."""
+
+    def __init__(self, xy: List[Tuple[float, float]], cell: float):
+        self.xy, self.cell = xy, cell
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+        for i, (x, y) in enumerate(xy):
+            self.cells.setdefault(self._key(x, y), []).append(i)
+        gx = [k[0] for k in self.cells]; gy = [k[1] for k in self.cells]
+        self.span = max(max(gx) - min(gx), max(gy) - min(gy))  # rings needed to cover every cell
+
+    def _key(self, x: float, y: float) -> Tuple[int, int]:
+        return int(math.floor(x / self.cell)), int(math.floor(y / self.cell))
+
+    def remove(self, i: int):
+        self.cells[self._key(*self.xy[i])].remove(i)
+
+    def nearest(self, i: int, k: int) -> List[int]:
+        x, y = self.xy[i]
+        cx, cy = self._key(x, y)
+        found: List[Tuple[float, int]] = []
+        r = 0
+        while True:
+            for gx in range(cx - r, cx + r + 1):
+                for gy in ((cy - r, cy + r) if abs(gx - cx) != r else range(cy - r, cy + r + 1)):
+                    for j in self.cells.get((gx, gy), ()):
+                        found.append((math.dist((x, y), self.xy[j]), j))
+            found.sort()
+            # anything beyond ring r is at least r * cell away
+            if (len(found) >= k and found[k - 1][0] <= r * self.cell) or r > self.span:
+                return [j for _, j in found[:k]]
+            r += 1
+
+XY = Dict[int, Tuple[float, float]]  # poi index -> projected km
+
+def _path_len(order: List[int], xy: XY) -> float:
+    return sum(math.dist(xy[a], xy[b]) for a, b in zip(order, order[1:]))
+
+def _leg(xy: XY, a: Optional[int], b: Optional[int]) -> float:
+    # None is the open end of the path: no edge to pay for
+    return math.dist(xy[a], xy[b]) if a is not None and b is not None else 0.0
+
+def order_stops(idx: List[int], xy: XY) -> List[int]:
+    """Open walking path through `idx`: nearest neighbour from an outer stop, then 2-opt
+    (either end of the path may move)."""
+    if len(idx) < 3:
+        return list(idx)
+    cx = sum(xy[i][0] for i in idx) / len(idx)
+    cy = sum(xy[i][1] for i in idx) / len(idx)
+    cur = max(idx, key=lambda i: math.dist(xy[i], (cx, cy)))
+    left = set(idx) - {cur}
+    route = [cur]
+    while left:
+        cur = min(left, key=lambda j: math.dist(xy[cur], xy[j]))
+        left.remove(cur)
+        route.append(cur)
+    n = len(route)
+    improved = True
+    while improved:
+        improved = False
+        for a in range(-1, n - 2):  # a = -1 reverses a prefix, i.e. picks a new start
+            for b in range(a + 2, n):
+                p = route[a] if a >= 0 else None
+                q, r = route[a + 1], route[b]
+                s = route[b + 1] if b + 1 < n else None
+                old = _leg(xy, p, q) + _leg(xy, r, s)
+                new = _leg(xy, p, r) + _leg(xy, q, s)
+                if new < old - 1e-9:
+                    route[a + 1:b + 1] = reversed(route[a + 1:b + 1])
+                    improved = True
+    return route
+
+def schedule(pois: List[Poi], days: int, stops: int, rainy: Sequence[bool] = (),
+             pool_factor: float = POOL_FACTOR) -> List[List[int]]:
+    """Indices into `pois` (rank order) for each day, in visiting order."""
+    days = max(days, 1)
+    # split over the whole list: guide names without coordinates ranked ahead of the
+    # table rows must not crowd the routable POIs out of the slots
+    geo = [i for i, p in enumerate(pois) if p.lat is not None and p.lon is not None]
+    plain = [i for i, p in enumerate(pois) if p.lat is None or p.lon is None]
+    n_geo = min(days * stops, len(geo))
+    pool = geo[:max(n_geo, int(n_geo * pool_factor))]
+
+    groups: List[List[int]] = [[] for _ in range(days)]
+    if pool:
+        xy_all = _project([pois[i] for i in pool])
+        xy = {i: v for i, v in zip(pool, xy_all)}
+        xs = [v[0] for v in xy_all]; ys = [v[1] for v in xy_all]
+        area = max((max(xs) - min(xs)) * (max(ys) - min(ys)), 1e-6)
+        grid = _Grid(xy_all, cell=max(math.sqrt(area / len(pool)) * 2, 0.05))
+        free = set(range(len(pool)))
+        quota = [n_geo // days + (1 if d < n_geo % days else 0) for d in range(days)]
+        for d in range(days):
+            if not quota[d] or not free:
+                continue
+            seed = min(free)  # best-ranked free POI anchors the day
+            take = grid.nearest(seed, quota[d])
+            for j in take:
+                free.discard(j)
+                grid.remove(j)
+            groups[d] = [pool[j] for j in take]
+        # rainy dates get the days with the most indoor stops
+        if rainy and any(rainy):
+            by_indoor = sorted(range(days), key=lambda d: -sum(is_indoor(pois[i]) for i in groups[d]))
+            by_rain = sorted(range(days), key=lambda d: not (d < len(rainy) and rainy[d]))
+            reordered: List[List[int]] = [[] for _ in range(days)]
+            for g, d in zip(by_indoor, by_rain):
+                reordered[d] = groups[g]
+            groups = reordered
+        groups = [order_stops(g, xy) for g in groups]
+
+    # POIs without coordinates fill the remaining slots, after the routed stops
+    it = iter(plain)
+    for g in groups:
+        while len(g) < stops:
+            i = next(it, None)
+            if i is None:
+                break
+            g.append(i)
+    return groups
+
+def route_km(pois: List[Poi], day: List[int]) -> float:
+    """Straight-line walking distance of one day's stops that have coordinates."""
+    pts = [pois[i] for i in day if pois[i].lat is not None and pois[i].lon is not None]
+    return _path_len(list(range(len(pts))), dict(enumerate(_project(pts)))) if len(pts) > 1 else 0.0
@@ -1,35 +1,127 @@
-from ics import Calendar, Event
+from ics import Event
+from collections import OrderedDict
 from datetime import datetime, timedelta
-import os
-
-def make_ics(plan_md: str, city: str, start_date: str, days: int, out_dir: str = "exports"):
-    os.makedirs(out_dir, exist_ok=True)
-    cal = Calendar()
-    # very naive: split plan by "Day N:" headings
-    blocks = []
-    cur = []
-    for line in plan_md.splitlines():
-        if line.strip().lower().startswith("day ") and ":" in line:
-            if cur:
-                blocks.append("\n".join(cur))
-                cur = [line]
-            else:
-                cur = [line]
-        else:
-            cur.append(line)
-    if cur:
-        blocks.append("\n".join(cur))
+from typing import Dict, Optional, Tuple
+import hashlib, os, threading
 
+from ..models.itinerary import Itinerary
+
+# Calendars live in memory, addressed by the sha256 of their bytes, and are served
+# from /plans/{trip_id}/calendar.ics. Set ICS_EXPORT_DIR to also keep them on disk
+# (e.g. a volume shared by all workers/nodes, which then serve each other's trips).
+EXPORT_DIR = os.getenv("ICS_EXPORT_DIR", "")
+MAX_BYTES = int(os.getenv("ICS_STORE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+def render_ics(itinerary: Itinerary, city: str, start_date: str) -> bytes:
+    # one 09:00-17:00 event per itinerary day
     d0 = datetime.fromisoformat(start_date)
-    for i, block in enumerate(blocks[:days]):
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//travel-concierge//itinerary//EN"]
+    for i, day in enumerate(itinerary.days):
         ev = Event()
         ev.name = f"{city} — Day {i+1}"
         ev.begin = d0 + timedelta(days=i, hours=9)
         ev.duration = timedelta(hours=8)
-        ev.description = block
-        cal.events.add(ev)
+        ev.description = day.render()
+        # stable uid (ics picks a random one) so the same plan gives the same bytes
+        ev.uid = hashlib.sha256(f"{city}|{start_date}|{ev.description}".encode("utf-8")).hexdigest()[:32] + "@travel-concierge"
+        lines.append(ev.serialize())
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(lines) + "\r\n").encode("utf-8")
+
+class IcsStore:
+    """Bounded LRU of calendar bytes by content hash, plus trip_id -> hash.
+
+    Trips can be pinned (the plan cache pins the trips it can still hand out);
+    their calendars are never evicted, so they may take the store past max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = MAX_BYTES, export_dir: str = EXPORT_DIR):
+        self.max_bytes, self.export_dir = max_bytes, export_dir
+        self._lock = threading.Lock()
+        self._blobs: "OrderedDict[str, bytes]" = OrderedDict()
+        self._trips: "OrderedDict[str, str]" = OrderedDict()
+        self._pinned: Dict[str, str] = {}  # trip_id -> hash
+        self._bytes = 0
+
+    def put(self, trip_id: str, body: bytes) -> str:
+        digest = hashlib.sha256(body).hexdigest()
+        with self._lock:
+            if digest not in self._blobs:
+                self._blobs[digest] = body
+                self._bytes += len(body)
+            self._blobs.move_to_end(digest)
+            self._trips[trip_id] = digest
+            self._evict(keep=digest)
+            while len(self._trips) > len(self._blobs) * 4 + 1024:  # ids of evicted blobs go eventually
+                self._trips.popitem(last=False)
+        if self.export_dir:
+            self._write(trip_id, digest, body)
+        return digest
+
+    def _evict(self, keep: str):
+        # caller holds _lock; oldest unpinned blobs go first, `keep` (the newest) never
+        excess = self._bytes - self.max_bytes
+        if excess <= 0:
+            return
+        pinned = set(self._pinned.values())
+        victims = []
+        for digest, blob in self._blobs.items():
+            if excess <= 0:
+                break
+            if digest != keep and digest not in pinned:
+                victims.append(digest)
+                excess -= len(blob)
+        for digest in victims:
+            self._bytes -= len(self._blobs.pop(digest))
+
+    def pin(self, trip_id: str):
+        with self._lock:
+            digest = self._trips.get(trip_id)
+            if digest in self._blobs:
+                self._pinned[trip_id] = digest
+
+    def unpin(self, trip_id: str):
+        with self._lock:
+            self._pinned.pop(trip_id, None)
+
+    def _write(self, trip_id: str, digest: str, body: bytes):
+        os.makedirs(os.path.join(self.export_dir, "trips"), exist_ok=True)
+        path = os.path.join(self.export_dir, f"{digest}.ics")
+        if not os.path.exists(path):  # content-addressed: same name, same bytes
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(body)
+            os.replace(tmp, path)
+        with open(os.path.join(self.export_dir, "trips", trip_id), "w", encoding="utf-8") as f:
+            f.write(digest)
+
+    def get(self, trip_id: str) -> Optional[Tuple[str, bytes]]:
+        """(sha256 hex, calendar bytes), or None if unknown/evicted."""
+        with self._lock:
+            digest = self._trips.get(trip_id) or self._pinned.get(trip_id)
+            body = self._blobs.get(digest) if digest else None
+            if body is not None:
+                self._blobs.move_to_end(digest)
+                return digest, body
+        return self._read(trip_id) if self.export_dir else None
+
+    def _read(self, trip_id: str) -> Optional[Tuple[str, bytes]]:
+        if not trip_id.isalnum():
+            return None  # it becomes a file name
+        try:
+            with open(os.path.join(self.export_dir, "trips", trip_id), "r", encoding="utf-8") as f:
+                digest = f.read().strip()
+            with open(os.path.join(self.export_dir, f"{digest}.ics"), "rb") as f:
+                return digest, f.read()
+        except OSError:
+            return None
+
+store = IcsStore()
+
+def calendar_url(trip_id: str) -> str:
+    return f"/plans/{trip_id}/calendar.ics"
 
-    path = os.path.join(out_dir, f"{city.lower().replace(' ','_')}_{start_date}.ics")
-    with open(path, "w", encoding="utf-8") as f:
-        f.writelines(cal)
-    return path
+def make_ics(itinerary: Itinerary, city: str, start_date: str, trip_id: str) -> str:
+    """Render and store the trip's calendar; returns the URL path it is served from."""
+    store.put(trip_id, render_ics(itinerary, city, start_date))
+    return calendar_url(trip_id)
@@ -1,10 +1,180 @@
-import requests
+# apps/api/tools/fx.py
+"""In-process FX rate table.
+
+One Frankfurter snapshot (all currencies against EUR) is kept in memory,
+refreshed in the background and persisted for warm restarts. Any cross rate is
+computed locally, so a conversion is a dictionary lookup.
+"""
+import asyncio, json, logging, os, threading, time
+from typing import Any, Dict, Optional, Tuple
+
+from . import geocode, http_client
+
+log = logging.getLogger(__name__)
+
+FX_URL = "https://api.frankfurter.app/latest"
+BASE = "EUR"
+REFRESH_S = float(os.getenv("FX_REFRESH_S", str(6 * 3600)))  # ECB publishes once a working day
+CACHE_PATH = os.getenv("FX_CACHE_PATH", os.path.join("cache", "fx_rates.json"))  # "" disables disk
+
+# ISO 3166 country -> ISO 4217 currency for the currencies Frankfurter (ECB) quotes;
+# destinations elsewhere are budgeted in the traveller's own currency
+CURRENCY_BY_COUNTRY = {
+    **dict.fromkeys(["AT", "BE", "HR", "CY", "EE", "FI", "FR", "DE", "GR", "IE", "IT", "LV", "LT", "LU",
+                     "MT", "NL", "PT", "SK", "SI", "ES", "AD", "MC", "SM", "VA", "ME", "XK"], "EUR"),
+    "US": "USD", "GB": "GBP", "JP": "JPY", "CH": "CHF", "LI": "CHF", "CZ": "CZK", "DK": "DKK", "HU": "HUF",
+    "PL": "PLN", "RO": "RON", "SE": "SEK", "NO": "NOK", "IS": "ISK", "TR": "TRY", "BG": "BGN", "AU": "AUD",
+    "BR": "BRL", "CA": "CAD", "CN": "CNY", "HK": "HKD", "ID": "IDR", "IL": "ILS", "IN": "INR", "KR": "KRW",
+    "MX": "MXN", "MY": "MYR", "NZ": "NZD", "PH": "PHP", "SG": "SGD", "TH": "THB", "ZA": "ZAR",
+}
+
+class RateTable:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rates: Dict[str, float] = {}
+        self.as_of: Optional[str] = None      # ECB reference date of the snapshot
+        self.fetched_at: Optional[float] = None
+
+    def _set(self, js: dict, fetched_at: float):
+        rates = {k.upper(): float(v) for k, v in js["rates"].items()}
+        rates[js.get("base", BASE).upper()] = 1.0
+        with self._lock:
+            self.rates, self.as_of, self.fetched_at = rates, js.get("date"), fetched_at
+
+    def load(self) -> bool:
+        if not CACHE_PATH or not os.path.exists(CACHE_PATH):
+            return False
+        try:
+            with open(CACHE_PATH, "r", encoding="utf-8") as f:
+                js = json.load(f)
+            self._set(js, js["fetched_at"])
+            return True
+        except Exception:
+            return False
+
+    def _save(self, js: dict):
+        if not CACHE_PATH:
+            return
+        os.makedirs(os.path.dirname(CACHE_PATH) or ".", exist_ok=True)
+        tmp = CACHE_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(js, f)
+        os.replace(tmp, CACHE_PATH)
+
+    def _apply(self, js: dict):
+        js = dict(js, fetched_at=time.time())
+        self._set(js, js["fetched_at"])
+        self._save(js)
+
+    def refresh(self):
+        r = http_client.session().get(FX_URL, params={"from": BASE}, timeout=http_client.TIMEOUT_S)
+        r.raise_for_status()
+        self._apply(r.json())
+
+    async def arefresh(self):
+        r = await http_client.async_client().get(FX_URL, params={"from": BASE})
+        r.raise_for_status()
+        js = dict(r.json(), fetched_at=time.time())
+        self._set(js, js["fetched_at"])
+        await asyncio.to_thread(self._save, js)
+
+    def stale(self) -> bool:
+        return self.fetched_at is None or time.time() - self.fetched_at > REFRESH_S
+
+    def rate(self, from_ccy: str, to_ccy: str) -> float:
+        return self.quote(from_ccy, to_ccy)[0]
+
+    def quote(self, from_ccy: str, to_ccy: str) -> Tuple[float, Optional[str], Optional[float]]:
+        """(rate, as_of, fetched_at), all from the same snapshot."""
+        with self._lock:
+            rates, as_of, fetched_at = self.rates, self.as_of, self.fetched_at
+        try:
+            return rates[to_ccy.upper()] / rates[from_ccy.upper()], as_of, fetched_at
+        except KeyError as e:
+            raise ValueError(f"Unknown currency: {e.args[0]}") from None
+
+    def info(self) -> Dict[str, object]:
+        with self._lock:
+            age = round(time.time() - self.fetched_at, 1) if self.fetched_at else None
+            return {"fx_rates_as_of": self.as_of, "fx_rates_age_s": age}
+
+table = RateTable()
+
+def _ensure_loaded():
+    # cold start: disk snapshot if there is one, otherwise a single blocking fetch
+    if not table.rates and not table.load():
+        table.refresh()
 
 def convert(amount: float, from_ccy: str, to_ccy: str):
+    """Returns (converted_amount, rate)."""
+    if from_ccy.upper() == to_ccy.upper():
+        return amount, 1.0
+    _ensure_loaded()
+    rate = table.rate(from_ccy, to_ccy)
+    return amount * rate, rate
+
+async def aconvert(amount: float, from_ccy: str, to_ccy: str):
     if from_ccy.upper() == to_ccy.upper():
         return amount, 1.0
-    r = requests.get(f"https://api.frankfurter.app/latest", params={"amount": amount, "from": from_ccy, "to": to_ccy})
-    r.raise_for_status()
-    js = r.json()
-    rate = js["rates"][to_ccy.upper()]
-    return rate, rate/amount if amount else 0.0
+    # normally the refresher thread has filled the table; disk I/O stays off the event loop
+    if not table.rates and not await asyncio.to_thread(table.load):
+        await table.arefresh()
+    rate = table.rate(from_ccy, to_ccy)
+    return amount * rate, rate
+
+def rates_info() -> Dict[str, object]:
+    """Age/date of the snapshot conversions are using."""
+    return table.info()
+
+def local_currency(country: Optional[str]) -> Optional[str]:
+    return CURRENCY_BY_COUNTRY.get((country or "").upper())
+
+def _local_quote(amount: float, from_ccy: str, country: Optional[str]) -> Dict[str, Any]:
+    # table already loaded (unless no conversion is needed)
+    to_ccy = local_currency(country) or from_ccy.upper()
+    if to_ccy == from_ccy.upper():
+        rate, as_of, fetched_at = 1.0, None, None
+    else:
+        rate, as_of, fetched_at = table.quote(from_ccy, to_ccy)
+    return {"local_currency": to_ccy, "budget_local": round(amount * rate, 2), "fx_rate": rate,
+            "fx_rates_as_of": as_of,
+            "fx_rates_age_s": round(time.time() - fetched_at, 1) if fetched_at else None}
+
+def to_local(amount: float, from_ccy: str, city: str) -> Dict[str, Any]:
+    """`amount` in the destination's currency, with the rate and the snapshot it came from."""
+    country = geocode.country(city)
+    if local_currency(country) not in (None, from_ccy.upper()):
+        _ensure_loaded()
+    return _local_quote(amount, from_ccy, country)
+
+async def ato_local(amount: float, from_ccy: str, city: str) -> Dict[str, Any]:
+    country = await geocode.acountry(city)
+    if local_currency(country) not in (None, from_ccy.upper()) and not table.rates:
+        if not await asyncio.to_thread(table.load):
+            await table.arefresh()
+    return _local_quote(amount, from_ccy, country)
+
+# ---------- background refresh ----------
+_stop = threading.Event()
+_thread: Optional[threading.Thread] = None
+
+def _refresh_loop(interval_s: float):
+    while True:
+        if table.stale():
+            try:
+                table.refresh()
+            except Exception as e:
+                log.warning("FX refresh failed, keeping the previous snapshot: %s: %s", type(e).__name__, e)
+        if _stop.wait(min(interval_s, 300)):
+            return
+
+def start_refresher(interval_s: float = REFRESH_S):
+    global _thread
+    if _thread is None or not _thread.is_alive():
+        table.load()
+        _stop.clear()
+        _thread = threading.Thread(target=_refresh_loop, args=(interval_s,), name="fx-refresh", daemon=True)
+        _thread.start()
+
+def stop_refresher():
+    _stop.set()
@@ -0,0 +1,215 @@
+# apps/api/tools/geocode.py
+"""Shared Open-Meteo geocoder.
+
+Every caller (weather, POIs, ingestion) goes through `lookup`, which checks an
+in-process LRU first, then an optional SQLite store that survives restarts,
+and only then the network. Unknown cities are cached as negative entries so a
+typo doesn't cost a round trip on every request. Concurrent misses for the same
+city share one upstream call.
+"""
+import asyncio, os, sqlite3, threading, time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Optional, Tuple, Dict
+
+from . import http_client
+
+GEOCODE_URL = "https://geocoding-api.open-meteo.com/v1/search"
+
+# ---------- CONFIG ----------
+CACHE_SIZE = int(os.getenv("GEOCODE_CACHE_SIZE", "1024"))
+TTL_S = float(os.getenv("GEOCODE_TTL_S", str(30 * 24 * 3600)))         # coordinates barely move
+NEGATIVE_TTL_S = float(os.getenv("GEOCODE_NEGATIVE_TTL_S", str(24 * 3600)))
+DB_PATH = os.getenv("GEOCODE_DB_PATH", os.path.join("cache", "geocode.sqlite3"))  # "" disables disk
+
+Geo = Tuple[float, float, str]  # (lat, lon, timezone)
+
+_lock = threading.Lock()     # LRU, stats and in-flight lookups
+_db_lock = threading.Lock()  # the SQLite connection
+_lru: "OrderedDict[str, Tuple[Optional[Geo], float, Optional[str]]]" = OrderedDict()  # key -> (geo | None, expires_at, country)
+_db: Optional[sqlite3.Connection] = None
+_inflight: Dict[str, Future] = {}  # key -> lookup in progress
+_stats = {"hits": 0, "disk_hits": 0, "misses": 0, "negative_hits": 0, "coalesced": 0}
+
+def _key(city: str) -> str:
+    return " ".join(city.split()).casefold()
+
+def _conn() -> Optional[sqlite3.Connection]:
+    global _db
+    if not DB_PATH:
+        return None
+    if _db is None:
+        os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+        _db = sqlite3.connect(DB_PATH, check_same_thread=False)
+        _db.execute("PRAGMA journal_mode=WAL")
+        _db.execute(
+            "CREATE TABLE IF NOT EXISTS geocode ("
+            " key TEXT PRIMARY KEY, lat REAL, lon REAL, tz TEXT, expires_at REAL, country TEXT)"
+        )
+        if "country" not in {row[1] for row in _db.execute("PRAGMA table_info(geocode)")}:
+            # rows from before the country column would never get one; it's only a cache
+            _db.execute("ALTER TABLE geocode ADD COLUMN country TEXT")
+            _db.execute("DELETE FROM geocode")
+        _db.commit()
+    return _db
+
+def _remember(key: str, geo: Optional[Geo], expires_at: float, country: Optional[str] = None):
+    # caller holds _lock
+    _lru[key] = (geo, expires_at, country)
+    _lru.move_to_end(key)
+    while len(_lru) > CACHE_SIZE:
+        _lru.popitem(last=False)
+
+def _memory(key: str) -> Tuple[bool, Optional[Geo]]:
+    """Return (found, geo) from the LRU. `found` with geo None is a negative hit."""
+    with _lock:
+        entry = _lru.get(key)
+        if entry and entry[1] > time.time():
+            _lru.move_to_end(key)
+            _stats["hits" if entry[0] else "negative_hits"] += 1
+            return True, entry[0]
+    return False, None
+
+def _disk(key: str) -> Tuple[bool, Optional[Geo]]:
+    # SQLite I/O under its own lock, so LRU hits never wait on the disk
+    with _db_lock:
+        db = _conn()
+        if db is None:
+            return False, None
+        row = db.execute(
+            "SELECT lat, lon, tz, expires_at, country FROM geocode WHERE key = ?", (key,)
+        ).fetchone()
+    if not row or row[3] <= time.time():
+        return False, None
+    geo = (row[0], row[1], row[2]) if row[0] is not None else None
+    with _lock:
+        _remember(key, geo, row[3], row[4])
+        _stats["disk_hits" if geo else "negative_hits"] += 1
+    return True, geo
+
+def _cached(key: str) -> Tuple[bool, Optional[Geo]]:
+    found, geo = _memory(key)
+    return (found, geo) if found else _disk(key)
+
+def _remember_fresh(key: str, geo: Optional[Geo], country: Optional[str] = None) -> float:
+    expires_at = time.time() + (TTL_S if geo else NEGATIVE_TTL_S)
+    with _lock:
+        _remember(key, geo, expires_at, country)
+    return expires_at
+
+def _persist(key: str, geo: Optional[Geo], expires_at: float, country: Optional[str] = None):
+    with _db_lock:
+        db = _conn()
+        if db is not None:
+            lat, lon, tz = geo if geo else (None, None, None)
+            db.execute(
+                "INSERT OR REPLACE INTO geocode (key, lat, lon, tz, expires_at, country) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, lat, lon, tz, expires_at, country),
+            )
+            db.commit()
+
+def _store(key: str, geo: Optional[Geo], country: Optional[str] = None):
+    _persist(key, geo, _remember_fresh(key, geo, country), country)
+
+def _claim(key: str) -> Tuple[Future, bool]:
+    """(future, leader). Only the leader calls the API; concurrent misses for the
+    same city wait on its future."""
+    with _lock:
+        entry = _lru.get(key)
+        if entry and entry[1] > time.time():  # stored while we were checking the disk
+            done: Future = Future()
+            done.set_result(entry[0])
+            return done, False
+        fut = _inflight.get(key)
+        if fut is not None:
+            _stats["coalesced"] += 1
+            return fut, False
+        fut = _inflight[key] = Future()
+        _stats["misses"] += 1
+        return fut, True
+
+def _settle(key: str, fut: Future, geo: Optional[Geo] = None, exc: Optional[BaseException] = None):
+    with _lock:
+        _inflight.pop(key, None)
+    if exc is not None:
+        fut.set_exception(exc)
+    else:
+        fut.set_result(geo)
+
+def _parse(js: dict) -> Tuple[Optional[Geo], Optional[str]]:
+    """(geo, ISO country code) of the best match."""
+    if not js.get("results"):
+        return None, None
+    res = js["results"][0]
+    return (float(res["latitude"]), float(res["longitude"]), res.get("timezone", "auto")), res.get("country_code")
+
+def lookup(city: str) -> Optional[Geo]:
+    """(lat, lon, tz) for a city, or None if Open-Meteo doesn't know it.
+
+    Network errors propagate and are not cached.
+    """
+    key = _key(city)
+    found, geo = _cached(key)
+    if found:
+        return geo
+    fut, leader = _claim(key)
+    if not leader:
+        return fut.result()
+    try:
+        r = http_client.session().get(GEOCODE_URL, params={"name": city, "count": 1}, timeout=http_client.TIMEOUT_S)
+        r.raise_for_status()
+        geo, country = _parse(r.json())
+        _store(key, geo, country)
+    except BaseException as e:
+        _settle(key, fut, exc=e)
+        raise
+    _settle(key, fut, geo)
+    return geo
+
+async def alookup(city: str) -> Optional[Geo]:
+    """Async `lookup` on the shared httpx client; SQLite I/O runs off the event loop."""
+    key = _key(city)
+    found, geo = _memory(key)
+    if not found:
+        found, geo = await asyncio.to_thread(_disk, key)
+    if found:
+        return geo
+    fut, leader = _claim(key)
+    if not leader:
+        return await asyncio.wrap_future(fut)
+    try:
+        r = await http_client.async_client().get(GEOCODE_URL, params={"name": city, "count": 1})
+        r.raise_for_status()
+        geo, country = _parse(r.json())
+        await asyncio.to_thread(_persist, key, geo, _remember_fresh(key, geo, country), country)
+    except BaseException as e:
+        _settle(key, fut, exc=e)
+        raise
+    _settle(key, fut, geo)
+    return geo
+
+def _country(key: str) -> Optional[str]:
+    with _lock:
+        entry = _lru.get(key)
+    return entry[2] if entry else None
+
+def country(city: str) -> Optional[str]:
+    """ISO 3166 country code of the city (from the same cached lookup), or None."""
+    return _country(_key(city)) if lookup(city) else None
+
+async def acountry(city: str) -> Optional[str]:
+    return _country(_key(city)) if await alookup(city) else None
+
+def stats() -> Dict[str, int]:
+    with _lock:
+        return dict(_stats, size=len(_lru))
+
+def clear(disk: bool = False):
+    """Drop the in-process cache (and optionally the persistent one)."""
+    with _lock:
+        _lru.clear()
+    with _db_lock:
+        db = _conn() if disk else None
+        if db is not None:
+            db.execute("DELETE FROM geocode")
+            db.commit()
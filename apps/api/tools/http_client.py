@@ -0,0 +1,53 @@
+# apps/api/tools/http_client.py
+"""Pooled HTTP clients shared by every tool.
+
+Sync tools use one `requests.Session` (keep-alive, bounded pool); the async
+path uses one `httpx.AsyncClient` that the FastAPI lifespan opens and closes.
+"""
+import os, threading
+from typing import Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+TIMEOUT_S = float(os.getenv("HTTP_TIMEOUT_S", "20"))
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+HEADERS = {"User-Agent": "travel-concierge/0.1 (https://example.com; contact: you@example.com)"}
+
+_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+_async_client: Optional[httpx.AsyncClient] = None
+
+def session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                s.headers.update(HEADERS)
+                _session = s
+    return _session
+
+def open_async_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            timeout=TIMEOUT_S,
+            headers=HEADERS,
+            limits=httpx.Limits(max_connections=POOL_SIZE * 4, max_keepalive_connections=POOL_SIZE),
+        )
+    return _async_client
+
+def async_client() -> httpx.AsyncClient:
+    # normally opened by the app lifespan; scripts calling ainvoke get one lazily
+    return _async_client or open_async_client()
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
@@ -1,11 +1,11 @@
 # apps/api/tools/trips_wiki.py
-import requests
-from .weather import geocode  # reuse your geocoder
+from .weather import geocode, ageocode  # reuse your geocoder
+from . import http_client
 
-def list_poi(city: str, radius_m=3000, limit=20):
-    lat, lon, _tz = geocode(city)
-    url = "https://en.wikipedia.org/w/api.php"
-    params = {
+WIKI_API = "https://en.wikipedia.org/w/api.php"
+
+def _params(lat, lon, radius_m, limit) -> dict:
+    return {
         "action": "query",
         "list": "geosearch",
         "gscoord": f"{lat}|{lon}",
@@ -13,8 +13,19 @@ def list_poi(city: str, radius_m=3000, limit=20):
         "gslimit": min(limit, 50),
         "format": "json"
     }
-    r = requests.get(url, params=params, timeout=20)
-    r.raise_for_status()
-    js = r.json().get("query", {}).get("geosearch", [])
+
+def _titles(js: dict):
     # Return simple names; you can fetch extracts later with prop=extracts
-    return [item["title"] for item in js]
+    return [item["title"] for item in js.get("query", {}).get("geosearch", [])]
+
+def list_poi(city: str, radius_m=3000, limit=20):
+    lat, lon, _tz = geocode(city)
+    r = http_client.session().get(WIKI_API, params=_params(lat, lon, radius_m, limit), timeout=http_client.TIMEOUT_S)
+    r.raise_for_status()
+    return _titles(r.json())
+
+async def alist_poi(city: str, radius_m=3000, limit=20):
+    lat, lon, _tz = await ageocode(city)
+    r = await http_client.async_client().get(WIKI_API, params=_params(lat, lon, radius_m, limit))
+    r.raise_for_status()
+    return _titles(r.json())
@@ -1,46 +1,166 @@
-import requests
-from datetime import date as _date
+import os, threading, time
+from collections import OrderedDict
+from datetime import date as _date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from . import geocode as geocoder
+from . import http_client
+
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+
+# 1) precipitation_probability_max is widely supported for daily;
+# 2) if that fails (HTTP 400 etc.), fall back to precipitation_sum
+DAILY_VARIANTS = [
+    "temperature_2m_max,temperature_2m_min,precipitation_probability_max",
+    "temperature_2m_max,temperature_2m_min,precipitation_sum",
+]
+
+# ---------- forecast cache ----------
+# Forecasts are cached per (location, day). Entries live until the next model
+# run is published: the global models behind Open-Meteo run every 6 h and show
+# up a few hours later. Past days no longer change, so they keep much longer.
+MODEL_RUN_HOURS_UTC = (0, 6, 12, 18)
+MODEL_AVAILABLE_AFTER_H = float(os.getenv("FORECAST_AVAILABLE_AFTER_H", "4"))
+PAST_DAY_TTL_S = 7 * 24 * 3600
+FORECAST_CACHE_DAYS = int(os.getenv("FORECAST_CACHE_DAYS", "50000"))
+
+Loc = Tuple[float, float]
+_lock = threading.Lock()
+_days: "OrderedDict[Tuple[float, float, str], Tuple[int, Dict[str, float], float]]" = OrderedDict()  # -> (variant, values, expires_at)
+_variant: Dict[Loc, int] = {}  # which DAILY_VARIANTS entry worked for a location
+_stats = {"day_hits": 0, "day_misses": 0, "fetches": 0}
+
+def next_model_refresh(now: Optional[datetime] = None) -> datetime:
+    """When the next model run becomes available (UTC)."""
+    now = now or datetime.now(timezone.utc)
+    day0 = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    for d in (0, 1):
+        for h in MODEL_RUN_HOURS_UTC:
+            t = day0 + timedelta(days=d, hours=h + MODEL_AVAILABLE_AFTER_H)
+            if t > now:
+                return t
+    return now + timedelta(hours=6)
+
+def current_model_run(now: Optional[datetime] = None) -> str:
+    """Identifier of the forecast currently being served (changes when a new run lands)."""
+    return (next_model_refresh(now) - timedelta(hours=6)).strftime("%Y-%m-%dT%H")
+
+def _loc(lat, lon) -> Loc:
+    return round(float(lat), 3), round(float(lon), 3)  # ~100 m; same city, same grid cell
+
+def _dates(start: str, end: str) -> List[str]:
+    s = _date.fromisoformat(start)
+    return [(s + timedelta(days=i)).isoformat() for i in range(_days_between(start, end))]
+
+def _missing(loc: Loc, dates: List[str]) -> List[str]:
+    now = time.time()
+    out = []
+    with _lock:
+        want = _variant.get(loc)
+        for d in dates:
+            hit = _days.get((*loc, d))
+            if hit and hit[2] > now and (want is None or hit[0] == want):
+                _days.move_to_end((*loc, d))
+                _stats["day_hits"] += 1
+            else:
+                out.append(d)
+                _stats["day_misses"] += 1
+    return out
+
+def _variant_order(loc: Loc) -> List[int]:
+    # try the variable set that worked here before, so the 400-then-retry is paid once
+    first = _variant.get(loc, 0)
+    return [first] + [i for i in range(len(DAILY_VARIANTS)) if i != first]
+
+def _store(loc: Loc, variant: int, js: dict):
+    daily = js.get("daily") or {}
+    times = daily.get("time", [])
+    today = _date.today().isoformat()
+    fresh_until = next_model_refresh().timestamp()
+    with _lock:
+        _variant[loc] = variant
+        _stats["fetches"] += 1
+        for i, t in enumerate(times):
+            values = {k: v[i] for k, v in daily.items() if k != "time" and i < len(v)}
+            expires = time.time() + PAST_DAY_TTL_S if t < today else fresh_until
+            _days[(*loc, t)] = (variant, values, expires)
+            _days.move_to_end((*loc, t))
+        while len(_days) > FORECAST_CACHE_DAYS:
+            _days.popitem(last=False)
+
+def _assemble(loc: Loc, lat, lon, tz, dates: List[str]) -> dict:
+    # rebuild the Open-Meteo response shape from cached days
+    daily: Dict[str, list] = {"time": []}
+    with _lock:
+        rows = [(d, _days.get((*loc, d))) for d in dates]
+    for d, hit in rows:
+        if not hit:
+            continue
+        daily["time"].append(d)
+        for k, v in hit[1].items():
+            daily.setdefault(k, []).append(v)
+    return {"latitude": lat, "longitude": lon, "timezone": tz, "daily": daily}
+
+def forecast_cache_stats() -> Dict[str, int]:
+    with _lock:
+        return dict(_stats, days=len(_days))
 
 def geocode(city: str):
-    r = requests.get(
-        "https://geocoding-api.open-meteo.com/v1/search",
-        params={"name": city, "count": 1}
-    )
-    r.raise_for_status()
-    js = r.json()
-    if not js.get("results"):
+    # cached; shared with trips.list_poi and rag/ingest
+    geo = geocoder.lookup(city)
+    if geo is None:
+        raise ValueError(f"City not found: {city}")
+    return geo
+
+async def ageocode(city: str):
+    geo = await geocoder.alookup(city)
+    if geo is None:
         raise ValueError(f"City not found: {city}")
-    res = js["results"][0]
-    return res["latitude"], res["longitude"], res.get("timezone", "auto")
+    return geo
 
 def _days_between(start: str, end: str) -> int:
     s = _date.fromisoformat(start); e = _date.fromisoformat(end)
     return max((e - s).days + 1, 1)
 
-def get_weather(city: str, start: str, end: str):
-    lat, lon, tz = geocode(city)
-
-    base = {
+def _params(lat, lon, tz, start: str, end: str, daily: str) -> dict:
+    return {
         "latitude": lat,
         "longitude": lon,
         "timezone": tz,
         "start_date": start,
         "end_date": end,
+        "daily": daily,
     }
 
-    # 1) Try with precipitation_probability_max (widely supported for daily)
-    params = dict(base)
-    params["daily"] = "temperature_2m_max,temperature_2m_min,precipitation_probability_max"
-    r = requests.get("https://api.open-meteo.com/v1/forecast", params=params)
-
-    # 2) If that fails (HTTP 400 etc.), fall back to precipitation_sum
-    if r.status_code >= 400:
-        params = dict(base)
-        params["daily"] = "temperature_2m_max,temperature_2m_min,precipitation_sum"
-        r = requests.get("https://api.open-meteo.com/v1/forecast", params=params)
+def get_weather(city: str, start: str, end: str):
+    lat, lon, tz = geocode(city)
+    loc, dates = _loc(lat, lon), _dates(start, end)
+    missing = _missing(loc, dates)
+    if missing:
+        # one call covering the span of uncached days
+        for variant in _variant_order(loc):
+            r = http_client.session().get(
+                FORECAST_URL, params=_params(lat, lon, tz, missing[0], missing[-1], DAILY_VARIANTS[variant]),
+                timeout=http_client.TIMEOUT_S)
+            if r.status_code < 400:
+                break
+        r.raise_for_status()
+        _store(loc, variant, r.json())
+    return _assemble(loc, lat, lon, tz, dates)
 
-    r.raise_for_status()
-    return r.json()
+async def aget_weather(city: str, start: str, end: str):
+    lat, lon, tz = await ageocode(city)
+    loc, dates = _loc(lat, lon), _dates(start, end)
+    missing = _missing(loc, dates)
+    if missing:
+        client = http_client.async_client()
+        for variant in _variant_order(loc):
+            r = await client.get(
+                FORECAST_URL, params=_params(lat, lon, tz, missing[0], missing[-1], DAILY_VARIANTS[variant]))
+            if r.status_code < 400:
+                break
+        r.raise_for_status()
+        _store(loc, variant, r.json())
+    return _assemble(loc, lat, lon, tz, dates)
 
 def weather_brief(js):
     daily = js.get("daily", {}) or {}
@@ -78,3 +198,13 @@ def weather_brief(js):
         lines.append(f"{t}: {tmin:.0f}–{tmax:.0f}°C, {ptxt}")
 
     return "Forecast:\n" + "\n".join(lines[:5])
+
+def rainy_days(js, min_prob: float = 50, min_mm: float = 2.0) -> List[bool]:
+    """One flag per forecast day: likely wet enough to favour indoor stops."""
+    daily = (js or {}).get("daily", {}) or {}
+    out = []
+    for i in range(len(daily.get("time", []))):
+        p = (daily.get("precipitation_probability_max") or daily.get("precipitation_probability_mean") or [None] * (i + 1))[i]
+        mm = (daily.get("precipitation_sum") or [None] * (i + 1))[i]
+        out.append((p is not None and p >= min_prob) or (mm is not None and mm >= min_mm))
+    return out
@@ -0,0 +1,66 @@
+# bench/embed_throughput.py
+"""Ingest embedding throughput (chunks/s) by backend and worker count.
+
+    python -m bench.embed_throughput --backends torch onnx-int8 --workers 1 2 4 8 --threads 2
+
+Chunks are the fixture guides from bench/fakes.py cut with ingest's splitter,
+repeated to --chunks, so lengths look like a real ingest. Each row embeds the
+same texts through rag/embedding.EmbeddingEngine; model load time is reported
+separately. `--compare-order` adds a run without length bucketing, and ONNX
+rows report mean cosine similarity against the first torch row's vectors.
+Needs the real model (sentence-transformers; onnxruntime for the ONNX rows).
+"""
+import argparse, json, time
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from apps.api.rag import embedding, ingest
+from bench import fakes
+
+def corpus(n: int):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=ingest.CHUNK_SIZE, chunk_overlap=ingest.CHUNK_OVERLAP)
+    base = [c for city in fakes.CITIES for text in (fakes.guide(city), fakes.encyclopedia(city))
+            for c in splitter.split_text(text)]
+    return [f"{base[i % len(base)]} ({i})" for i in range(n)]  # suffix: no two texts identical
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backends", nargs="+", default=["torch"], choices=["torch", "onnx", "onnx-int8"])
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--threads", type=int, default=embedding.EMBED_THREADS)
+    ap.add_argument("--micro-batch", type=int, default=embedding.MICRO_BATCH)
+    ap.add_argument("--chunks", type=int, default=4000)
+    ap.add_argument("--compare-order", action="store_true", help="also run without length bucketing")
+    ap.add_argument("--out", help="write rows as JSON")
+    args = ap.parse_args()
+
+    texts = corpus(args.chunks)
+    print(f"{len(texts)} chunks, mean {np.mean([len(t) for t in texts]):.0f} chars")
+    print(f"{'backend':10} {'workers':>7} {'threads':>7} {'bucketed':>8} {'load s':>7} {'chunks/s':>9} {'cosine':>7}")
+    rows, reference = [], None
+    for backend in args.backends:
+        for w in args.workers:
+            for by_length in ([True, False] if args.compare_order else [True]):
+                with embedding.EmbeddingEngine(backend, workers=w, threads=args.threads,
+                                               micro_batch=args.micro_batch, by_length=by_length) as eng:
+                    eng.embed_documents(texts[: args.micro_batch * w])  # warm every worker
+                    t0 = time.perf_counter()
+                    vecs = np.asarray(eng.embed_documents(texts), dtype=np.float32)
+                    took = time.perf_counter() - t0
+                    load_s = eng.load_s
+                if reference is None and backend == "torch":
+                    reference = vecs
+                cosine = float(np.mean(np.sum(vecs * reference, axis=1))) if reference is not None else None
+                row = {"backend": backend, "workers": w, "threads": args.threads, "bucketed": by_length,
+                       "load_s": round(load_s, 2), "chunks_per_s": round(len(texts) / took, 1),
+                       "cosine_vs_torch": round(cosine, 4) if cosine is not None else None}
+                rows.append(row)
+                print(f"{backend:10} {w:>7} {args.threads:>7} {str(by_length):>8} {row['load_s']:>7} "
+                      f"{row['chunks_per_s']:>9} {row['cosine_vs_torch'] if cosine is not None else '-':>7}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"chunks": len(texts), "micro_batch": args.micro_batch, "rows": rows}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
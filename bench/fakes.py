@@ -0,0 +1,329 @@
+# bench/fakes.py
+"""Local stand-ins for every upstream the app and ingest talk to.
+
+One threaded HTTP server answers, from deterministic fixtures, the calls made
+by tools/ (Open-Meteo geocoding + forecast, Frankfurter, Wikipedia geosearch)
+and rag/ingest.py (Wikivoyage extracts, Overpass, Wikipedia geosearch), plus
+the embedding sidecar's /embed. `install(url)` points the modules at it. The
+two things ingest reaches through libraries rather than HTTP (WikipediaLoader
+and the embedding engine) are replaced with fixture/hashing versions.
+
+    fakes = FakeUpstreams(latency_ms=20).start()
+    install(fakes.url)
+
+Every request can be delayed by `latency_ms` to stand in for the network, and
+per-route request counts are kept so a benchmark can report upstream calls.
+"""
+import json, math, random, re, threading, time, zlib
+from datetime import date, timedelta
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+DIM = 384  # all-MiniLM-L6-v2's width, so the Chroma collection looks the same
+
+# name -> (lat, lon, timezone); the ingest city list
+CITIES: Dict[str, Tuple[float, float, str]] = {
+    "Rome": (41.8933, 12.4829, "Europe/Rome"),
+    "Tokyo": (35.6895, 139.6917, "Asia/Tokyo"),
+    "Paris": (48.8534, 2.3488, "Europe/Paris"),
+    "London": (51.5085, -0.1257, "Europe/London"),
+    "Barcelona": (41.3888, 2.1590, "Europe/Madrid"),
+    "Berlin": (52.5244, 13.4105, "Europe/Berlin"),
+    "Amsterdam": (52.3740, 4.8897, "Europe/Amsterdam"),
+    "Prague": (50.0880, 14.4208, "Europe/Prague"),
+    "Vienna": (48.2085, 16.3721, "Europe/Vienna"),
+    "Istanbul": (41.0138, 28.9497, "Europe/Istanbul"),
+    "Athens": (37.9838, 23.7278, "Europe/Athens"),
+}
+
+# name -> ISO country code, as Open-Meteo's geocoder reports it
+COUNTRIES = {"Rome": "IT", "Tokyo": "JP", "Paris": "FR", "London": "GB", "Barcelona": "ES", "Berlin": "DE",
+             "Amsterdam": "NL", "Prague": "CZ", "Vienna": "AT", "Istanbul": "TR", "Athens": "GR"}
+
+FX_DATE = "2025-01-03"
+FX_RATES = {"USD": 1.0321, "GBP": 0.8312, "JPY": 162.85, "CHF": 0.9385, "CZK": 25.17, "TRY": 36.52,
+            "AUD": 1.6612, "CAD": 1.4853, "SEK": 11.507, "PLN": 4.2743, "HUF": 413.35, "DKK": 7.4598}
+
+_PLACES = ["Piazza", "Palazzo", "Museum", "Gallery", "Basilica", "Gardens", "Market", "Bridge", "Tower",
+           "Castle", "Fountain", "Library", "Theatre", "Quarter", "Cathedral", "Park", "Harbour", "Gate"]
+_NAMES = ["Royal", "Old Town", "St. Anne's", "Imperial", "National", "Grand", "Civic", "Riverside",
+          "Botanical", "Modern Art", "Archaeological", "Merchant", "Victory", "Golden", "Cardinal", "Hill"]
+_CATEGORIES = ["museum", "attraction", "viewpoint", "monument", "gallery", "artwork", "castle", "ruins"]
+_WORDS = ("history food art architecture nightlife parks shopping museums street market cafe wine "
+          "bakery ruins church square river walk tram metro ticket queue morning evening local dish "
+          "neighbourhood festival garden view rooftop bar gallery exhibition fresco mosaic palace").split()
+
+def _rng(*parts) -> random.Random:
+    return random.Random(zlib.crc32("|".join(map(str, parts)).encode("utf-8")))
+
+@lru_cache(maxsize=None)
+def sights(city: str, n: int = 40) -> List[Dict[str, object]]:
+    """The city's POIs: name, coordinates (a few neighbourhoods, like a real city), category."""
+    lat0, lon0, _ = CITIES[city]
+    rng = _rng("sights", city)
+    hoods = [(lat0 + rng.gauss(0, 0.02), lon0 + rng.gauss(0, 0.03)) for _ in range(6)]
+    out, seen = [], set()
+    while len(out) < n:
+        name = f"{rng.choice(_NAMES)} {rng.choice(_PLACES)}"
+        if name in seen:
+            name = f"{name} {city}"
+            if name in seen:
+                continue
+        seen.add(name)
+        la, lo = rng.choice(hoods)
+        out.append({"name": name, "lat": round(la + rng.gauss(0, 0.003), 6),
+                    "lon": round(lo + rng.gauss(0, 0.004), 6), "category": rng.choice(_CATEGORIES)})
+    return out
+
+def _prose(rng: random.Random, sentences: int) -> str:
+    return " ".join(" ".join(rng.choice(_WORDS) for _ in range(rng.randint(8, 18))).capitalize() + "."
+                    for _ in range(sentences))
+
+@lru_cache(maxsize=None)
+def guide(city: str) -> str:
+    """Wikivoyage plain-text extract (explaintext): "==" / "===" headings, listings as
+    plain "Name, address. blurb" lines; the "See" listings name the sights."""
+    rng = _rng("guide", city)
+    parts = [f"{city} is a city worth a few days. " + _prose(rng, 6)]
+    for heading in ("Understand", "Get around"):
+        parts.append(f"== {heading} ==\n" + "\n\n".join(_prose(rng, 5) for _ in range(3)))
+    see = sights(city)[: len(sights(city)) * 3 // 4]
+    parts.append("== See ==\n" + _prose(rng, 2))
+    for sub, chunk in (("Landmarks", see[::2]), ("Museums and galleries", see[1::2])):
+        parts.append(f"=== {sub} ===\n" + _prose(rng, 1) + "\n\n"
+                     + "\n".join(f"{p['name']}, {_street(rng)}. {_prose(rng, 1)}" for p in chunk))
+    for heading in ("Do", "Eat", "Drink", "Sleep"):
+        parts.append(f"== {heading} ==\n" + _prose(rng, 1) + "\n\n"
+                     + "\n".join(f"{rng.choice(_NAMES)} {heading} Spot, {_street(rng)}. {_prose(rng, 2)}"
+                                  for _ in range(8)))
+    return "\n\n\n".join(parts)
+
+def _street(rng: random.Random) -> str:
+    return f"{rng.choice(_NAMES)} Street {rng.randint(1, 120)}"
+
+@lru_cache(maxsize=None)
+def encyclopedia(city: str) -> str:
+    rng = _rng("wikipedia", city)
+    return "\n\n".join([f"{city} is the capital and largest city of its region. " + _prose(rng, 4)]
+                       + [f"== {h} ==\n" + _prose(rng, 10) for h in ("History", "Geography", "Culture", "Economy")])
+
+def embed(texts: List[str]) -> List[List[float]]:
+    """Hashed bag of words, L2-normalised: no model, but similar texts land close together."""
+    out = np.zeros((len(texts), DIM), dtype=np.float32)
+    for i, text in enumerate(texts):
+        for tok in re.findall(r"\w+", text.casefold()):
+            h = zlib.crc32(tok.encode("utf-8"))
+            out[i, h % DIM] += 1.0 if h & 0x80000000 else -1.0
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    return (out / np.where(norms == 0, 1, norms)).tolist()
+
+def _nearest(lat: float, lon: float) -> Optional[str]:
+    city = min(CITIES, key=lambda c: (CITIES[c][0] - lat) ** 2 + (CITIES[c][1] - lon) ** 2)
+    return city if abs(CITIES[city][0] - lat) < 0.5 and abs(CITIES[city][1] - lon) < 0.5 else None
+
+# ---------- routes: (query params, body) -> JSON ----------
+def _geocode(q, _body):
+    name = " ".join(q.get("name", "").split()).casefold()
+    for city, (lat, lon, tz) in CITIES.items():
+        if city.casefold() == name:
+            return {"results": [{"name": city, "latitude": lat, "longitude": lon, "timezone": tz,
+                                 "country_code": COUNTRIES[city]}]}
+    return {"generationtime_ms": 0.1}  # Open-Meteo leaves "results" out when nothing matches
+
+def _forecast(q, _body):
+    lat, lon = float(q["latitude"]), float(q["longitude"])
+    start, end = date.fromisoformat(q["start_date"]), date.fromisoformat(q["end_date"])
+    days = [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+    daily: Dict[str, list] = {"time": days}
+    for var in q.get("daily", "").split(","):
+        vals = []
+        for d in days:
+            rng = _rng(round(lat, 2), round(lon, 2), d)
+            tmax = round(12 + 18 * rng.random(), 1)
+            vals.append({"temperature_2m_max": tmax, "temperature_2m_min": round(tmax - 4 - 6 * rng.random(), 1),
+                         "precipitation_probability_max": rng.choice([0, 5, 10, 20, 35, 60, 85]),
+                         "precipitation_sum": round(max(0.0, rng.gauss(1, 4)), 1)}.get(var))
+        daily[var] = vals
+    return {"latitude": lat, "longitude": lon, "timezone": q.get("timezone", "GMT"), "daily": daily}
+
+def _fx(q, _body):
+    return {"amount": 1.0, "base": q.get("from", "EUR"), "date": FX_DATE, "rates": FX_RATES}
+
+def _geosearch(q):
+    lat, lon = (float(x) for x in q["gscoord"].split("|"))
+    city = _nearest(lat, lon)
+    rows = []
+    for i, p in enumerate(sights(city) if city else []):
+        dist = 111_000 * math.hypot(p["lat"] - lat, (p["lon"] - lon) * math.cos(math.radians(lat)))
+        if dist <= float(q.get("gsradius", 10_000)):
+            rows.append({"pageid": zlib.crc32(p["name"].encode("utf-8")), "ns": 0, "title": p["name"],
+                         "lat": p["lat"], "lon": p["lon"], "dist": round(dist, 1), "primary": ""})
+    rows.sort(key=lambda r: r["dist"])
+    return {"batchcomplete": "", "query": {"geosearch": rows[: int(q.get("gslimit", 10))]}}
+
+def _wikivoyage(q, _body):
+    if q.get("list") == "geosearch":
+        return _geosearch(q)
+    pages = []
+    for title in q.get("titles", "").split("|"):
+        if title in CITIES:
+            pages.append({"pageid": zlib.crc32(title.encode("utf-8")), "ns": 0, "title": title, "extract": guide(title)})
+        elif title:
+            pages.append({"ns": 0, "title": title, "missing": True})
+    return {"batchcomplete": True, "query": {"pages": pages}}
+
+def _wikipedia(q, _body):
+    return _geosearch(q)
+
+def _overpass(_q, body):
+    query = parse_qs(body.decode("utf-8")).get("data", [""])[0]
+    m = re.search(r"around:(\d+),([-\d.]+),([-\d.]+)", query)
+    limit = re.search(r"out center (\d+)", query)
+    city = _nearest(float(m.group(2)), float(m.group(3))) if m else None
+    elements = []
+    for i, p in enumerate(sights(city) if city else []):
+        tag = "historic" if p["category"] in ("monument", "castle", "ruins") else "tourism"
+        if i % 3 == 2:  # some come back as ways, which carry "center" instead of lat/lon
+            elements.append({"type": "way", "id": i, "center": {"lat": p["lat"], "lon": p["lon"]},
+                             "tags": {"name": p["name"], tag: p["category"]}})
+        else:
+            elements.append({"type": "node", "id": i, "lat": p["lat"], "lon": p["lon"],
+                             "tags": {"name": p["name"], tag: p["category"]}})
+    return {"version": 0.6, "elements": elements[: int(limit.group(1))] if limit else elements}
+
+def _embed(_q, body):
+    return {"vectors": embed(json.loads(body)["texts"])}
+
+ROUTES = {
+    "/geocode/v1/search": _geocode,
+    "/forecast/v1/forecast": _forecast,
+    "/fx/latest": _fx,
+    "/wikivoyage/w/api.php": _wikivoyage,
+    "/wikipedia/w/api.php": _wikipedia,
+    "/overpass/api/interpreter": _overpass,
+    "/embedder/embed": _embed,
+}
+
+class FakeUpstreams:
+    def __init__(self, latency_ms: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.latency_s = latency_ms / 1000.0
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+        fakes = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+
+            def _serve(self):
+                url = urlparse(self.path)
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                route = ROUTES.get(url.path)
+                with fakes._lock:
+                    fakes._counts[url.path] = fakes._counts.get(url.path, 0) + 1
+                if fakes.latency_s:
+                    time.sleep(fakes.latency_s)
+                if route is None:
+                    status, payload = 404, {"error": f"no fake for {url.path}"}
+                else:
+                    try:
+                        status, payload = 200, route({k: v[-1] for k, v in parse_qs(url.query).items()}, body)
+                    except (KeyError, ValueError) as e:
+                        status, payload = 400, {"error": f"{type(e).__name__}: {e}"}
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = _serve
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeUpstreams":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-upstreams", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+# ---------- library-level stand-ins for ingest ----------
+class FakeEmbeddings:
+    """EmbeddingEngine stand-in, in-process (same vectors the fake /embed returns)."""
+
+    batch_hint = 128
+
+    def __init__(self, **_):
+        self.chunks, self.seconds = 0, 0.0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        t0 = time.perf_counter()
+        out = embed(texts)
+        self.chunks, self.seconds = self.chunks + len(texts), self.seconds + time.perf_counter() - t0
+        return out
+
+    def stats(self) -> Dict[str, object]:
+        return {"backend": "fake", "workers": 1, "threads": 1, "chunks": self.chunks, "seconds": round(self.seconds, 3),
+                "load_s": 0.0, "chunks_per_s": round(self.chunks / self.seconds, 1) if self.seconds else None}
+
+    def close(self):
+        pass
+
+    def __enter__(self) -> "FakeEmbeddings":
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+class FixtureWikipediaLoader:
+    """WikipediaLoader stand-in: one recorded-style page per known city."""
+
+    def __init__(self, query: str, load_max_docs: int = 1, lang: str = "en", **_):
+        self.query, self.load_max_docs = query, load_max_docs
+
+    def load(self):
+        from langchain_core.documents import Document
+        if self.query not in CITIES:
+            return []
+        text = encyclopedia(self.query)
+        return [Document(page_content=text, metadata={
+            "title": self.query, "summary": text.split("\n\n", 1)[0],
+            "source": f"https://en.wikipedia.org/wiki/{self.query}"})][: self.load_max_docs]
+
+def install(url: str):
+    """Point tools/ and rag/ at the fakes served from `url`."""
+    from apps.api.rag import fetch, ingest, retriever
+    from apps.api.tools import fx, geocode, trips, weather
+    geocode.GEOCODE_URL = f"{url}/geocode/v1/search"
+    weather.FORECAST_URL = f"{url}/forecast/v1/forecast"
+    fx.FX_URL = f"{url}/fx/latest"
+    trips.WIKI_API = f"{url}/wikipedia/w/api.php"
+    ingest.API = f"{url}/wikivoyage/w/api.php"
+    ingest.WIKI_API = f"{url}/wikipedia/w/api.php"
+    ingest.OVERPASS = f"{url}/overpass/api/interpreter"
+    ingest.WikipediaLoader = FixtureWikipediaLoader
+    ingest.embedding.EmbeddingEngine = FakeEmbeddings
+    ingest.CITIES = list(CITIES)
+    retriever.EMBEDDER_URL = f"{url}/embedder"
+    # the per-host politeness limits are for the real APIs
+    fetch.HOST_LIMITS[urlparse(url).netloc] = (10_000.0, 10_000, 64)
@@ -0,0 +1,68 @@
+# bench/itinerary_route.py
+"""Route-aware scheduler vs the old rank-order day assignment.
+
+    python -m bench.itinerary_route --pois 50 200 500 --days 4 --pace packed [--guide 12]
+
+POIs are scattered around a handful of neighbourhoods (like a real city's
+sights), ranked randomly. Reports straight-line walking km per trip summed
+over days, and scheduling time. "same POIs" re-partitions exactly the stops
+the old assignment picked (pool factor 1); "scheduler" may trade a far-off POI
+for a nearby slightly lower-ranked one (the default pool factor). --guide puts
+that many names without coordinates ahead of the ranked POIs, as guide
+headings are in the planner; "routed" counts the stops with coordinates.
+"""
+import argparse, random, statistics, time
+
+from apps.api import scheduler
+from apps.api.models.itinerary import Poi
+
+def city(n: int, rng: random.Random, lat0: float = 41.9, lon0: float = 12.49, guide: int = 0):
+    hoods = [(lat0 + rng.gauss(0, 0.025), lon0 + rng.gauss(0, 0.035)) for _ in range(8)]
+    pois = [Poi(f"guide {i}", source="guide") for i in range(guide)]
+    for i in range(n):
+        la, lo = rng.choice(hoods)
+        cat = rng.choice(["museum", "attraction", "viewpoint", "monument", "gallery", "artwork"])
+        pois.append(Poi(f"poi {i}", la + rng.gauss(0, 0.004), lo + rng.gauss(0, 0.005), cat, "osm"))
+    return pois
+
+def legacy(n: int, days: int, stops: int):
+    # what _rule_based_plan did: rank order, `stops` at a time, visited as listed
+    return [list(range(d * stops, min((d + 1) * stops, n))) for d in range(days)]
+
+def km(pois, plan):
+    return sum(scheduler.route_km(pois, day) for day in plan)
+
+def routed(pois, plan):
+    return sum(pois[i].lat is not None for day in plan for i in day)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pois", type=int, nargs="+", default=[50, 200, 500])
+    ap.add_argument("--days", type=int, default=4)
+    ap.add_argument("--pace", default="packed", choices=sorted(scheduler.PACE_STOPS))
+    ap.add_argument("--trials", type=int, default=50)
+    ap.add_argument("--guide", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    for n in args.pois:
+        stops = scheduler.per_day(n, args.days, args.pace)
+        rows = {"legacy": ([], [], []), "same POIs": ([], [], []), "scheduler": ([], [], [])}
+        for _ in range(args.trials):
+            pois = city(n, rng, guide=args.guide)
+            rainy = [rng.random() < 0.3 for _ in range(args.days)]
+            for name, fn in (("legacy", lambda: legacy(len(pois), args.days, stops)),
+                             ("same POIs", lambda: scheduler.schedule(pois, args.days, stops, rainy, pool_factor=1)),
+                             ("scheduler", lambda: scheduler.schedule(pois, args.days, stops, rainy))):
+                t0 = time.perf_counter()
+                plan = fn()
+                rows[name][1].append((time.perf_counter() - t0) * 1000)
+                rows[name][0].append(km(pois, plan))
+                rows[name][2].append(routed(pois, plan))
+        print(f"{n} POIs + {args.guide} guide, {args.days} days x {stops} stops ({args.trials} trials)")
+        for name, (dist, ms, geo) in rows.items():
+            print(f"  {name:10s} walk {statistics.mean(dist):6.1f} km   routed {statistics.mean(geo):4.1f}   "
+                  f"p50 {statistics.median(ms):.2f} ms  max {max(ms):.2f} ms")
+
+if __name__ == "__main__":
+    main()
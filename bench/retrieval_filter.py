@@ -0,0 +1,68 @@
+# bench/retrieval_filter.py
+"""City-filtered vs unfiltered Chroma search on a synthetic corpus.
+
+    python -m bench.retrieval_filter --cities 200 --per-city 200
+
+Vectors are a shared "topic" component plus a weak per-city component, which
+mimics guide chunks: most of the signal is about sights/food/history, and the
+city name only nudges the embedding. No model is loaded.
+"""
+import argparse, statistics, tempfile, time
+
+import chromadb
+import numpy as np
+
+def build(cities: int, per_city: int, dim: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(16, dim))
+    city_vecs = rng.normal(size=(cities, dim))
+    client = chromadb.PersistentClient(path=tempfile.mkdtemp(prefix="bench-chroma-"))
+    col = client.create_collection("guides")
+    batch = 5000
+    ids, vecs, metas = [], [], []
+    for c in range(cities):
+        for j in range(per_city):
+            v = topics[rng.integers(16)] + 0.35 * city_vecs[c] + 0.3 * rng.normal(size=dim)
+            ids.append(f"{c}-{j}")
+            vecs.append((v / np.linalg.norm(v)).tolist())
+            metas.append({"city": f"city {c}"})
+            if len(ids) >= batch:
+                col.add(ids=ids, embeddings=vecs, metadatas=metas)
+                ids, vecs, metas = [], [], []
+    if ids:
+        col.add(ids=ids, embeddings=vecs, metadatas=metas)
+    return col, topics, city_vecs, rng
+
+def run(col, topics, city_vecs, rng, queries: int, k: int, filtered: bool):
+    lat, prec = [], []
+    for _ in range(queries):
+        c = int(rng.integers(len(city_vecs)))
+        q = topics[rng.integers(len(topics))] + 0.35 * city_vecs[c]
+        q = (q / np.linalg.norm(q)).tolist()
+        t0 = time.perf_counter()
+        res = col.query(query_embeddings=[q], n_results=k, where={"city": f"city {c}"} if filtered else None,
+                        include=["metadatas"])
+        lat.append((time.perf_counter() - t0) * 1000)
+        metas = res["metadatas"][0]
+        prec.append(sum(m["city"] == f"city {c}" for m in metas) / max(len(metas), 1))
+    lat.sort()
+    return {"p50_ms": round(statistics.median(lat), 2), "p95_ms": round(lat[int(0.95 * (len(lat) - 1))], 2),
+            "precision_at_k": round(statistics.mean(prec), 3)}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cities", type=int, default=200)
+    ap.add_argument("--per-city", type=int, default=200)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=300)
+    ap.add_argument("-k", type=int, default=10)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    col, topics, city_vecs, rng = build(args.cities, args.per_city, args.dim)
+    print(f"corpus: {args.cities * args.per_city} chunks, {args.cities} cities, built in {time.perf_counter() - t0:.1f}s")
+    for name, filtered in (("unfiltered", False), ("city filter", True)):
+        print(f"{name:12s}", run(col, topics, city_vecs, rng, args.queries, args.k, filtered))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+# bench/suite.py
+"""Offline benchmark and load test for the planner.
+
+    python -m bench.suite run [--out results.json] [--upstream-latency-ms 20] [--llm-latency-ms 300]
+    python -m bench.suite compare OLD.json NEW.json [--threshold 0.15]
+
+`run` works in a scratch directory (vector store, caches, prefs) against the
+local upstreams in bench/fakes.py and the echo chat model (LLM_PROVIDER=fake),
+so nothing leaves the machine and two runs see the same data:
+
+1. ingest    -- rag/ingest.py end to end against the fakes (skipped when
+                --workdir already holds an index, unless --reingest)
+2. micro     -- Retriever.search (cached and uncached query vectors), the
+                rule-based plan (_merge_research: POI merge + scheduler),
+                critic_review and make_ics
+3. graph     -- app_graph.ainvoke: distinct trips one at a time (cold), the
+                same trips again (warm caches), then --graph-concurrency at once
+4. load      -- uvicorn serving the app on a local port, hammered over HTTP at
+                each --concurrency with unique bodies (plan cache misses) and a
+                repeated body (hits/coalesced)
+
+Results, with the upstream call counts and run metadata, go to one JSON file
+(default bench/results/<time>-<git rev>.json). `compare` lines two of them up
+and exits 1 if a latency grew or a throughput fell by more than --threshold.
+The load generator shares the server's process (and GIL), so absolute
+requests/s are conservative; compare runs made on the same machine.
+"""
+import argparse, asyncio, json, os, platform, random, socket, statistics, subprocess, sys, tempfile, threading, time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))  # `run` chdirs into a scratch dir before importing the app
+
+from bench import fakes  # noqa: E402  (no app imports at module level)
+
+INTERESTS = ["history", "food", "art", "architecture", "nightlife", "parks", "shopping", "museums"]
+
+def trips(n: int, seed: int) -> List[Dict[str, Any]]:
+    """`n` distinct TripRequest bodies (user, dates and interests differ, so no plan/LLM cache sharing)."""
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        start = date(2025, 9, 1) + timedelta(days=rng.randrange(60))
+        out.append({"user": f"bench-{seed}-{i}", "city": rng.choice(list(fakes.CITIES)),
+                    "start_date": start.isoformat(), "end_date": (start + timedelta(days=rng.randint(1, 4))).isoformat(),
+                    "budget": rng.choice([500, 1000, 2500]), "currency": rng.choice(["EUR", "USD", "GBP"]),
+                    "interests": rng.sample(INTERESTS, rng.randint(1, 3)), "pace": rng.choice(["relaxed", "packed"])})
+    return out
+
+def summarize(seconds: List[float]) -> Dict[str, float]:
+    ms = sorted(s * 1000 for s in seconds)
+    if not ms:
+        return {"n": 0}
+    q = lambda p: round(ms[min(len(ms) - 1, int(round(p * (len(ms) - 1))))], 3)
+    return {"n": len(ms), "mean_ms": round(statistics.fmean(ms), 3), "p50_ms": q(0.5), "p95_ms": q(0.95),
+            "p99_ms": q(0.99), "min_ms": round(ms[0], 3), "max_ms": round(ms[-1], 3)}
+
+def measure(fn: Callable[[int], Any], n: int, warmup: int = 3) -> Dict[str, float]:
+    for i in range(min(warmup, n)):
+        fn(i)
+    took = []
+    for i in range(n):
+        t0 = time.perf_counter()
+        fn(i)
+        took.append(time.perf_counter() - t0)
+    return summarize(took)
+
+# ---------- phases ----------
+def phase_ingest(args) -> Dict[str, Any]:
+    from apps.api.rag import ingest
+    if os.path.exists(os.path.join(ingest.PERSIST_DIR, "pois.sqlite3")) and not args.reingest:
+        return {"skipped": True}
+    t0 = time.perf_counter()
+    stats = ingest.main(incremental=False)
+    return {"seconds": round(time.perf_counter() - t0, 3), **{k: v for k, v in stats.items() if isinstance(v, (int, dict))}}
+
+def phase_micro(args) -> Dict[str, Any]:
+    from apps.api import graph
+    from apps.api.rag.retriever import get_retriever
+    from apps.api.tools import calendar as ics_tool
+    from apps.api.tools import fx as fx_tool
+    from apps.api.tools import weather as weather_tool
+    out: Dict[str, Any] = {}
+    r = get_retriever()
+    bodies = trips(64, seed=args.seed)
+    for b in bodies:  # every query vector cached before timing, whatever --iterations is
+        r.search(b["city"], b["interests"], k=10)
+    out["retriever.search"] = measure(lambda i: r.search(bodies[i % 64]["city"], bodies[i % 64]["interests"], k=10),
+                                      args.iterations, warmup=0)
+    # a never-seen interest forces the query through the encoder (here: the fake sidecar)
+    out["retriever.search.uncached_query"] = measure(
+        lambda i: r.search(bodies[i % 64]["city"], bodies[i % 64]["interests"] + [f"topic{i}-{time.monotonic_ns()}"], k=10),
+        args.iterations)
+
+    # the rule-based plan: guide headings + indexed POIs -> scheduled days
+    research = []
+    for b in bodies[:16]:
+        st = graph.TripState(**b)
+        research.append((b, {
+            "rag": (r.search(st.city, st.interests, k=10), None, 0.0),
+            "weather": (weather_tool.get_weather(st.city, st.start_date, st.end_date), None, 0.0),
+            "poi": (graph._indexed_pois(st.city), None, 0.0),
+            "fx": (fx_tool.to_local(st.budget, st.currency, st.city), None, 0.0),
+        }))
+    out["rule_based_plan"] = measure(lambda i: graph._merge_research(graph.TripState(**research[i % 16][0]),
+                                                                     research[i % 16][1]), args.iterations)
+    planned = [graph._merge_research(graph.TripState(**b), res) for b, res in research]
+    out["critic_review"] = measure(lambda i: graph.critic_review(planned[i % 16]), args.iterations)
+    out["make_ics"] = measure(lambda i: ics_tool.make_ics(planned[i % 16].itinerary, planned[i % 16].city,
+                                                          planned[i % 16].start_date, f"bench{i}"), args.iterations)
+    return out
+
+async def _graph(args) -> Dict[str, Any]:
+    from apps.api.graph import TripState, app_graph
+    from apps.api.tools import http_client
+    out: Dict[str, Any] = {}
+    bodies = trips(args.graph_trips, seed=args.seed + 1)
+
+    async def one(body) -> float:
+        t0 = time.perf_counter()
+        await app_graph.ainvoke(TripState(**body))
+        return time.perf_counter() - t0
+
+    try:
+        out["ainvoke.cold"] = summarize([await one(b) for b in bodies])
+        out["ainvoke.warm"] = summarize([await one(b) for b in bodies])  # forecast, query vector, LLM caches
+        sem = asyncio.Semaphore(args.graph_concurrency)
+
+        async def bounded(body):
+            async with sem:
+                return await one(body)
+
+        fresh = trips(args.graph_trips, seed=args.seed + 2)
+        t0 = time.perf_counter()
+        took = await asyncio.gather(*(bounded(b) for b in fresh))
+        wall = time.perf_counter() - t0
+        out["ainvoke.concurrent"] = dict(summarize(took), concurrency=args.graph_concurrency,
+                                         trips_per_s=round(len(fresh) / wall, 2))
+    finally:
+        # the client is bound to this loop; the load phase's server opens its own
+        await http_client.close_async_client()
+    return out
+
+def phase_graph(args) -> Dict[str, Any]:
+    return asyncio.run(_graph(args))
+
+class _Server:
+    """uvicorn on a free local port, in a thread."""
+
+    def __init__(self):
+        import uvicorn
+        from apps.api.main import app
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, name="bench-uvicorn", daemon=True)
+
+    def __enter__(self) -> str:
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("uvicorn failed to start")
+            time.sleep(0.05)
+        return f"http://127.0.0.1:{self.port}"
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+
+async def _load(url: str, bodies: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    import httpx
+    took: List[float] = []
+    statuses: Dict[str, int] = {}
+    cache: Dict[str, int] = {}
+    todo = iter(bodies)
+
+    async def worker(client):
+        for body in todo:  # shared iterator: each worker pulls the next body
+            t0 = time.perf_counter()
+            try:
+                r = await client.post("/plan", json=body)
+                status, source = str(r.status_code), r.headers.get("x-cache", "none")
+            except httpx.HTTPError as e:
+                status, source = type(e).__name__, "none"
+            took.append(time.perf_counter() - t0)
+            statuses[status] = statuses.get(status, 0) + 1
+            cache[source] = cache.get(source, 0) + 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        wall = time.perf_counter() - t0
+    return dict(summarize(took), concurrency=concurrency, rps=round(len(bodies) / wall, 2),
+                status=statuses, cache=cache)
+
+def _all_ok(name: str, res: Dict[str, Any]) -> Dict[str, Any]:
+    # latencies of failed requests aren't a benchmark
+    failed = {k: v for k, v in res["status"].items() if k != "200"}
+    if failed:
+        raise RuntimeError(f"{name}: {sum(failed.values())} of {res['n']} requests failed: {failed}")
+    return res
+
+def phase_load(args) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    with _Server() as url:
+        for c in args.concurrency:
+            unique = trips(args.requests, seed=args.seed + 100 + c)
+            out[f"plan.unique.c{c}"] = _all_ok(f"plan.unique.c{c}", asyncio.run(_load(url, unique, c)))
+            out[f"plan.repeat.c{c}"] = _all_ok(f"plan.repeat.c{c}",
+                                               asyncio.run(_load(url, [unique[0]] * args.requests, c)))
+    return out
+
+def _import_app():
+    # a graph that doesn't compile should stop the run here, not after ingest
+    try:
+        import apps.api.main  # noqa: F401  (builds the graph)
+    except Exception as e:
+        raise SystemExit(f"[bench] importing the app failed: {type(e).__name__}: {e}") from e
+
+# ---------- run / compare ----------
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args) -> Dict[str, Any]:
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="bench-suite-"))
+    os.makedirs(workdir, exist_ok=True)
+    upstreams = fakes.FakeUpstreams(latency_ms=args.upstream_latency_ms).start()
+    # before the app is imported: these are read at import / first use
+    os.environ.update({
+        "LLM_PROVIDER": "fake",
+        "FAKE_LLM_LATENCY_S": str(args.llm_latency_ms / 1000.0),
+        "PREFS_DB_PATH": os.path.join(workdir, "prefs.sqlite3"),
+        "EMBEDDER_URL": f"{upstreams.url}/embedder",
+        "ICS_EXPORT_DIR": "",
+    })
+    os.chdir(workdir)  # vectorstore/, cache/ are relative to the working directory
+    fakes.install(upstreams.url)
+
+    result: Dict[str, Any] = {"meta": {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "git_rev": _git_rev(), "python": platform.python_version(),
+        "platform": platform.platform(), "cpus": os.cpu_count(), "workdir": workdir,
+        "args": {k: v for k, v in vars(args).items() if k != "func"},
+    }}
+    phases = {"ingest": phase_ingest, "micro": phase_micro, "graph": phase_graph, "load": phase_load}
+    try:
+        _import_app()
+        for name in args.phases:
+            print(f"[bench] {name} ...", flush=True)
+            before = upstreams.counts()
+            t0 = time.perf_counter()
+            result[name] = phases[name](args)
+            after = upstreams.counts()
+            result[name]["_phase"] = {"seconds": round(time.perf_counter() - t0, 3),
+                                      "upstream_calls": {k: v - before.get(k, 0) for k, v in after.items()
+                                                         if v != before.get(k, 0)}}
+    finally:
+        upstreams.stop()
+
+    out = args.out or str(ROOT / "bench" / "results" / f"{time.strftime('%Y%m%d-%H%M%S')}-{_git_rev() or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    _print(result)
+    print(f"[bench] wrote {out}")
+    return result
+
+def _rows(result: Dict[str, Any]):
+    # (phase.metric, stats) for every entry with latency numbers
+    for phase, metrics in result.items():
+        if phase == "meta" or not isinstance(metrics, dict):
+            continue
+        for name, stats in metrics.items():
+            if isinstance(stats, dict) and "p50_ms" in stats:
+                yield f"{phase}.{name}", stats
+
+def _print(result: Dict[str, Any]):
+    print(f"{'metric':44} {'n':>5} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'per s':>9}")
+    for name, s in _rows(result):
+        rate = s.get("rps", s.get("trips_per_s", ""))
+        print(f"{name:44} {s['n']:>5} {s['p50_ms']:>10.2f} {s['p95_ms']:>10.2f} {s['p99_ms']:>10.2f} {rate:>9}")
+
+def compare(args) -> int:
+    with open(args.old, encoding="utf-8") as f:
+        old = dict(_rows(json.load(f)))
+    with open(args.new, encoding="utf-8") as f:
+        new = dict(_rows(json.load(f)))
+    regressions = 0
+    print(f"{'metric':44} {'p50 old':>10} {'p50 new':>10} {'p95 old':>10} {'p95 new':>10}  change")
+    for name in [n for n in new if n in old]:
+        o, n = old[name], new[name]
+        notes = []
+        for key in ("p50_ms", "p95_ms"):
+            if o[key] and n[key] > o[key] * (1 + args.threshold):
+                notes.append(f"{key} +{(n[key] / o[key] - 1) * 100:.0f}%")
+        for key in ("rps", "trips_per_s"):
+            if o.get(key) and n.get(key, 0) < o[key] * (1 - args.threshold):
+                notes.append(f"{key} -{(1 - n[key] / o[key]) * 100:.0f}%")
+        regressions += bool(notes)
+        print(f"{name:44} {o['p50_ms']:>10.2f} {n['p50_ms']:>10.2f} {o['p95_ms']:>10.2f} {n['p95_ms']:>10.2f}  "
+              + ("REGRESSION " + ", ".join(notes) if notes else "ok"))
+    print(f"{regressions} regression(s) beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run")
+    r.add_argument("--out", help="result file (default bench/results/<time>-<rev>.json)")
+    r.add_argument("--workdir", help="scratch dir; reuse one to skip re-ingesting")
+    r.add_argument("--reingest", action="store_true")
+    r.add_argument("--phases", nargs="+", default=["ingest", "micro", "graph", "load"],
+                   choices=["ingest", "micro", "graph", "load"])
+    r.add_argument("--seed", type=int, default=0)
+    r.add_argument("--upstream-latency-ms", type=float, default=0.0, help="added to every fake upstream call")
+    r.add_argument("--llm-latency-ms", type=float, default=0.0, help="fake chat model round trip")
+    r.add_argument("--iterations", type=int, default=200, help="per microbenchmark")
+    r.add_argument("--graph-trips", type=int, default=30)
+    r.add_argument("--graph-concurrency", type=int, default=8)
+    r.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    r.add_argument("--requests", type=int, default=200, help="per concurrency level and mix")
+    c = sub.add_parser("compare")
+    c.add_argument("old")
+    c.add_argument("new")
+    c.add_argument("--threshold", type=float, default=0.15, help="relative change counted as a regression")
+    args = ap.parse_args()
+    if args.cmd == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+from pathlib import Path
+
+from apps.api.rag import ingest
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+def test_explaintext_see_listings():
+    # Wikivoyage TextExtracts output (explaintext=1): "==" headings, listings as plain lines
+    text = (FIXTURES / "wikivoyage_rome_explaintext.txt").read_text(encoding="utf-8")
+    assert ingest.sight_names(text) == [
+        "Colosseum", "Roman Forum", "Palatine Hill", "Pantheon",
+        "St. Peter's Basilica", "Vatican Museums",
+        "Trevi Fountain", "Piazza Navona", "Spanish Steps",
+    ]
+
+def test_do_and_eat_listings_are_not_sights():
+    text = "== Do ==\nFood Tour of Testaccio, Piazza Testaccio.\n== Eat ==\nDa Enzo al 29, Via dei Vascellari 29.\n"
+    assert ingest.sight_names(text) == []
+
+def test_markdown_bullets():
+    text = "# Rome\n\n## Sights\n- Colosseum — arrive early\n- Trevi Fountain - throw a coin\n\n## Do\n- Vespa tour\n"
+    assert ingest.sight_names(text) == ["Colosseum", "Trevi Fountain"]
+
+def test_guide_pois_reads_whole_texts():
+    text = (FIXTURES / "wikivoyage_rome_explaintext.txt").read_text(encoding="utf-8")
+    pois = ingest.guide_pois({"rome": [text]})("Rome")
+    assert pois[0] == {"name": "Colosseum", "lat": None, "lon": None, "category": "guide"}
+    assert len(pois) == 9
@@ -0,0 +1,34 @@
+import math
+import random
+
+from apps.api import scheduler
+from apps.api.models.itinerary import Poi
+
+def _rome(n, seed=0):
+    rng = random.Random(seed)
+    return [Poi(f"sight {i}", 41.9 + rng.gauss(0, 0.02), 12.49 + rng.gauss(0, 0.03), "attraction", "osm")
+            for i in range(n)]
+
+def test_geo_pois_routed_when_guide_names_outnumber_them():
+    guide = [Poi(f"guide {i}", source="guide") for i in range(12)]
+    geo = _rome(8)
+    pois = guide + geo
+    days = scheduler.schedule(pois, days=2, stops=4)
+    placed = [i for day in days for i in day]
+    assert sorted(placed) == list(range(12, 20))  # every slot goes to a POI with coordinates
+    assert all(len(day) == 4 for day in days)
+
+def test_guide_names_fill_leftover_slots():
+    pois = [Poi(f"guide {i}", source="guide") for i in range(5)] + _rome(3)
+    days = scheduler.schedule(pois, days=2, stops=3)
+    assert sorted(i for day in days for i in day) == [0, 1, 2, 5, 6, 7]
+    for day in days:  # routed stops first, then the rest in rank order
+        geo = [i for i in day if pois[i].lat is not None]
+        assert day[:len(geo)] == geo
+
+def test_order_stops_can_move_the_start():
+    # nearest neighbour starts at 2 and walks 2 -> 3 -> 1 -> 0 -> 4; the shorter
+    # path 3 -> 2 -> 1 -> 0 -> 4 only differs by its first edge
+    xy = {0: (2.0, 3.0), 1: (1.0, 2.0), 2: (3.0, 0.0), 3: (4.0, 1.0), 4: (3.0, 4.0)}
+    route = scheduler.order_stops(list(xy), xy)
+    assert scheduler._path_len(route, xy) < scheduler._path_len([2, 3, 1, 0, 4], xy) - 0.3